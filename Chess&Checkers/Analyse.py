@@ -0,0 +1,129 @@
+#headless batch analysis: reads FEN strings (one per line) and writes one JSON line per position with the best move,
+#score, principal variation and node counts, positions are spread over a process pool and written back in input order
+#lines can be full FENs or EPD lines (anything after the fourth field that isn't a move counter is ignored),
+#blank lines and lines starting with # are skipped
+#analyse a file with: python Analyse.py positions.fen -o results.jsonl --depth 5 --time 2 --workers 4
+#read from stdin and write to stdout with: python Analyse.py - < positions.fen
+#scores are in pawns for the side to move, mate scores are SmartMoveFinder.CHECKMATE minus the plies to mate
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+import Tablebase
+
+#search context kept by each worker process between positions
+workerContext = None
+
+
+#yields the FEN on every line of the file that has one
+def readFens(f):
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+#runs in a worker process, settings is (depth, time limit, node limit, transposition table size, bitboards, tablebase directory,
+#include the search stats)
+#returns the result dictionary for one position
+def analysePosition(fen, settings):
+    global workerContext
+    depth, timeLimit, nodeLimit, ttSizeMB, bitboards, tablebaseDirectory, includeStats = settings
+    if workerContext is None:
+        workerContext = SmartMoveFinder.SearchContext(ttSizeMB=ttSizeMB)
+        if tablebaseDirectory is not None:
+            workerContext.tablebases = Tablebase.Tablebases(tablebaseDirectory)
+    context = workerContext
+    context.maxDepth = depth
+    context.timeLimit = timeLimit
+    context.nodeLimit = nodeLimit
+
+    result = {"fen": fen}
+    gs = BitboardEngine.BitboardGameState() if bitboards else ChessEngine.GameState()
+    gs.underpromotions = True
+    try:
+        gs.loadFen(fen)
+    except (ValueError, KeyError, IndexError) as e:
+        result["error"] = str(e)
+        return result
+    startTime = time.perf_counter()
+    try:
+        validMoves = gs.getValidMoves()
+        move = SmartMoveFinder.findBestMove(gs, validMoves, context)
+    except Exception as e: #one position the engine can't handle shouldn't lose the rest of the batch
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+        workerContext = None #the search was left half way, start the next position with a fresh context
+        return result
+    seconds = time.perf_counter() - startTime
+    if move is None:
+        result["bestMove"] = None
+        result["result"] = "checkmate" if gs.checkMate else "stalemate"
+        return result
+    result["bestMove"] = move.getChessNotation()
+    result["score"] = context.bestScore
+    result["pv"] = [pvMove.getChessNotation() for pvMove in context.principalVariation]
+    result["depth"] = context.completedDepth
+    result["nodes"] = context.nodes
+    result["qNodes"] = context.qNodes
+    result["tbHits"] = context.tbHits
+    result["seconds"] = round(seconds, 4)
+    if includeStats:
+        result["stats"] = context.stats.toDict()
+    return result
+
+#analyses every position from fens (an iterable of FEN strings) and yields the results in the same order
+#at most a few positions per worker are queued at once, so a huge file is streamed rather than read in one go
+def analyse(fens, settings, workers=None):
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for fen in fens:
+            pending.append(executor.submit(analysePosition, fen, settings))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a file of FEN positions and write the results as JSON lines")
+    parser.add_argument("input", help="file with one FEN per line, - for stdin")
+    parser.add_argument("-o", "--output", help="file for the JSON lines (default stdout)")
+    parser.add_argument("--depth", type=int, default=SmartMoveFinder.DEPTH, help="maximum search depth")
+    parser.add_argument("--time", type=float, help="seconds per position")
+    parser.add_argument("--nodes", type=int, help="node limit per position")
+    parser.add_argument("--workers", type=int, help="worker processes (default one per cpu)")
+    parser.add_argument("--hash", type=int, default=SmartMoveFinder.TT_SIZE_MB, help="transposition table MB per worker")
+    parser.add_argument("--bitboards", action="store_true", help="use the bitboard move generator")
+    parser.add_argument("--tablebases", nargs="?", const=Tablebase.defaultDirectory, help="probe the endgame tablebases in this directory")
+    parser.add_argument("--stats", action="store_true", help="add the search stats (per iteration nodes, cutoffs, table hits) to each result")
+    args = parser.parse_args(argv)
+
+    settings = (args.depth, args.time, args.nodes, args.hash, args.bitboards, args.tablebases, args.stats)
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    outputFile = sys.stdout if args.output is None else open(args.output, "w")
+    errors = 0
+    try:
+        for result in analyse(readFens(inputFile), settings, args.workers):
+            if "error" in result:
+                errors += 1
+            outputFile.write(json.dumps(result) + "\n")
+            outputFile.flush()
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    if errors:
+        print("%d position(s) could not be analysed" % errors, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
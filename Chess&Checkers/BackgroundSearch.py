@@ -0,0 +1,108 @@
+#runs the AI search on a worker thread so the window keeps responding while the AI thinks
+#the search works on its own copy of the position (rebuilt from a FEN snapshot), the frame loop keeps drawing the real board
+#and polls isFinished() every frame, cancel() stops the search through the context's stopRequested flag
+#pondering: after the AI moves it keeps searching the position after the reply it expects (the hash move of the position),
+#if the human plays that move the search carries on as the real search and keeps all the work done so far,
+#any other move cancels it and a new search starts
+
+import threading
+import SmartMoveFinder
+import ParallelSearch
+import Profiler
+
+
+class BackgroundSearch():
+    #search is a SmartMoveFinder.SearchContext or a ParallelSearch.ParallelSearch (no pondering, its workers can't be extended)
+    def __init__(self, search):
+        self.search = search
+        self.timeLimit = search.timeLimit #the time limit of a normal search, pondering searches without one
+        self.thread = None
+        self.searchState = None #the worker thread's copy of the position
+        self.searchKey = None #zobrist key of the position being searched
+        self.pondering = False
+        self.finished = False
+        self.resultID = None #moveID of the best move once the search is finished
+
+    def canPonder(self):
+        return isinstance(self.search, SmartMoveFinder.SearchContext)
+
+    #starts searching gs unless that position is already being searched (a ponder hit)
+    def start(self, gs):
+        if self.thread is not None and self.searchKey == gs.zobristKey:
+            if self.pondering: #the human played the expected move, give the search its normal time from now on
+                self.pondering = False
+                if self.timeLimit is not None:
+                    self.search.timeLimit = self.search.elapsed() + self.timeLimit
+            return
+        self.cancel()
+        self.launch(gs)
+
+    #starts searching the position after the reply the AI expects to gs, call right after the AI moves
+    def ponder(self, gs):
+        if not self.canPonder():
+            return
+        entry = self.search.transpositionTable.probe(gs.zobristKey)
+        if entry is None or entry[4] is None:
+            return
+        self.cancel()
+        self.launch(gs, entry[4])
+
+    def launch(self, gs, ponderMoveID=None):
+        searchState = ParallelSearch.gameStateFromSnapshot(ParallelSearch.positionSnapshot(gs))
+        Profiler.rebind(searchState) #pick up the profiler's wrapped move functions if it is on
+        if ponderMoveID is not None:
+            for move in searchState.getValidMoves():
+                if move.moveID == ponderMoveID:
+                    searchState.makeMove(move)
+            if len(searchState.moveLog) == 0: #hash move isn't legal here (key collision), nothing to ponder
+                return
+        self.pondering = ponderMoveID is not None
+        self.search.timeLimit = None if self.pondering else self.timeLimit
+        self.search.stopRequested = False
+        self.searchState = searchState
+        self.searchKey = searchState.zobristKey
+        self.finished = False
+        self.resultID = None
+        self.thread = threading.Thread(target=self.run, args=(searchState,), daemon=True)
+        self.thread.start()
+
+    #runs on the worker thread
+    def run(self, gs):
+        validMoves = gs.getValidMoves()
+        if isinstance(self.search, SmartMoveFinder.SearchContext):
+            move = SmartMoveFinder.findBestMove(gs, validMoves, self.search)
+        else:
+            move = self.search.findBestMove(gs, validMoves)
+        self.resultID = move.moveID if move is not None else None
+        self.finished = True
+
+    #True once the search for the position passed to start is done (a ponder search only counts after the ponder hit)
+    def isFinished(self):
+        return self.thread is not None and self.finished and not self.pondering
+
+    #the game states the search is using, pass them to Profiler.enable/disable with the real one so a search (or ponder)
+    #already running is profiled too
+    def gameStates(self):
+        return [self.searchState] if self.thread is not None else []
+
+    #the best move out of validMoves (the real position's moves), None if the search didn't find one
+    def getResult(self, validMoves):
+        self.thread = None
+        self.searchState = None
+        self.searchKey = None
+        for move in validMoves:
+            if move.moveID == self.resultID:
+                return move
+        return None
+
+    #stops the search (if there is one) and waits for the thread to finish
+    def cancel(self):
+        if self.thread is not None:
+            self.search.stopRequested = True
+            self.thread.join()
+        self.thread = None
+        self.searchState = None
+        self.searchKey = None
+        self.pondering = False
+        self.search.stopRequested = False
+        self.search.timeLimit = self.timeLimit
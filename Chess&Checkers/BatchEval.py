@@ -0,0 +1,175 @@
+#evaluates many positions in one go with NumPy: the same material and piece-square score as Evaluation.combineTerms
+#but for an N x 64 array of piece codes at once instead of one board at a time
+#the search uses it at the frontier (SearchContext(batchEvaluation=True), only without the quiescence search): all the
+#leaves below a depth 1 node are scored together instead of one by one
+#score a file of FENs with: python BatchEval.py positions.fen -o scores.jsonl
+#compare against scoring one position at a time with: python BatchEval.py positions.fen --benchmark
+#NumPy is optional, everything else in the game works without it (available is False when it isn't installed)
+
+import argparse
+import json
+import sys
+import time
+import ChessEngine
+import Evaluation
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+available = np is not None
+BATCH_SIZE = 4096 #positions scored at once by evaluateFens
+
+#piece code used in the arrays, 0 is an empty square
+pieceCodes = {"--": 0}
+for color in ('w', 'b'):
+    for pieceType in Evaluation.pieceScores:
+        pieceCodes[color + pieceType] = len(pieceCodes)
+
+if available:
+    #a square's two character string read as a little endian 16 bit number -> piece code, so a whole board converts at once
+    squareCodes = np.zeros(1 << 16, dtype=np.int8)
+    for piece, code in pieceCodes.items():
+        squareCodes[ord(piece[0]) | ord(piece[1]) << 8] = code
+    #the signed lookups from Evaluation, indexed by piece code (row 0 is the empty square and adds nothing)
+    materialArray = np.zeros(len(pieceCodes), dtype=np.int64)
+    phaseArray = np.zeros(len(pieceCodes), dtype=np.int64)
+    middlegameArray = np.zeros((len(pieceCodes), 64), dtype=np.int64)
+    endgameArray = np.zeros((len(pieceCodes), 64), dtype=np.int64)
+    for piece, code in pieceCodes.items():
+        if code != 0:
+            materialArray[code] = Evaluation.materialValues[piece]
+            phaseArray[code] = Evaluation.phaseValues[piece]
+            middlegameArray[code] = Evaluation.middlegameValues[piece]
+            endgameArray[code] = Evaluation.endgameValues[piece]
+    squareIndexes = np.arange(64)
+
+
+def checkAvailable():
+    if not available:
+        raise ImportError("batch evaluation needs NumPy (pip install numpy)")
+
+#board as one 128 character string, two characters a square in r*8 + c order
+def boardString(board):
+    return "".join(["".join(row) for row in board])
+
+#N x 64 array of piece codes for a list of boards
+def encodeBoards(boards):
+    checkAvailable()
+    data = "".join([boardString(board) for board in boards]).encode("ascii")
+    return squareCodes[np.frombuffer(data, dtype="<u2")].reshape(len(boards), 64)
+
+#scores for an N x 64 array of piece codes, in pawns, positive is good for white
+def evaluateCodes(codes):
+    checkAvailable()
+    material = materialArray[codes].sum(axis=1)
+    middlegame = middlegameArray[codes, squareIndexes].sum(axis=1)
+    endgame = endgameArray[codes, squareIndexes].sum(axis=1)
+    phase = np.minimum(phaseArray[codes].sum(axis=1), Evaluation.MAX_PHASE)
+    return material + (middlegame * phase + endgame * (Evaluation.MAX_PHASE - phase)) / (Evaluation.MAX_PHASE * 100)
+
+def evaluateBoards(boards):
+    if len(boards) == 0:
+        return np.zeros(0) if available else []
+    return evaluateCodes(encodeBoards(boards))
+
+#scores of the positions after each move in moves, for the side to move in gs (what a depth 0 search of each would give)
+#checkmates and stalemates are scored like scoreBoard, everything else goes through one batched evaluation
+def scoreChildren(gs, moves, turnMultiplier, checkmateScore, stalemateScore):
+    scores = [None] * len(moves)
+    boards = []
+    leaves = []
+    for i, move in enumerate(moves):
+        gs.makeMove(move)
+        gs.getValidMoves() #sets checkMate and staleMate
+        if gs.checkMate:
+            scores[i] = checkmateScore #the side that just moved (the side to move in gs) gave mate
+        elif gs.staleMate:
+            scores[i] = stalemateScore
+        else:
+            boards.append(boardString(gs.board))
+            leaves.append(i)
+        gs.undoMove()
+    if leaves:
+        data = "".join(boards).encode("ascii")
+        values = evaluateCodes(squareCodes[np.frombuffer(data, dtype="<u2")].reshape(len(leaves), 64))
+        for i, value in zip(leaves, values.tolist()):
+            scores[i] = turnMultiplier * value
+    return scores
+
+
+#yields (fen, score) for every FEN, parsed and scored BATCH_SIZE positions at a time
+#FENs that can't be read get None as their score
+def evaluateFens(fens, batchSize=BATCH_SIZE):
+    checkAvailable()
+    batch = []
+    for fen in fens:
+        batch.append(fen)
+        if len(batch) >= batchSize:
+            yield from evaluateFenBatch(batch)
+            batch = []
+    if batch:
+        yield from evaluateFenBatch(batch)
+
+def evaluateFenBatch(fens):
+    boards = []
+    readable = []
+    for fen in fens:
+        try:
+            boards.append(ChessEngine.parseFen(fen)[0])
+            readable.append(True)
+        except (ValueError, KeyError, IndexError):
+            readable.append(False)
+    values = iter(evaluateBoards(boards).tolist())
+    for fen, ok in zip(fens, readable):
+        yield fen, next(values) if ok else None
+
+#positions per second scoring the boards one at a time with Evaluation and all at once here
+def benchmark(boards):
+    startTime = time.perf_counter()
+    single = [Evaluation.combineTerms(*Evaluation.evaluationTerms(board)) for board in boards]
+    singleSeconds = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    batch = evaluateBoards(boards)
+    batchSeconds = time.perf_counter() - startTime
+    mismatches = sum(1 for a, b in zip(single, batch.tolist()) if abs(a - b) > 1e-9)
+    return {"positions": len(boards), "singleSeconds": round(singleSeconds, 4), "batchSeconds": round(batchSeconds, 4),
+            "speedup": round(singleSeconds / batchSeconds, 2) if batchSeconds > 0 else 0.0, "mismatches": mismatches}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a file of FEN positions with the batched NumPy evaluation")
+    parser.add_argument("input", help="file with one FEN per line, - for stdin")
+    parser.add_argument("-o", "--output", help="file for the JSON lines (default stdout)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="positions scored at once")
+    parser.add_argument("--benchmark", action="store_true", help="time the batch against one position at a time instead")
+    args = parser.parse_args(argv)
+    if not available:
+        print("NumPy isn't installed", file=sys.stderr)
+        return 1
+
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    fens = (line.strip() for line in inputFile if line.strip() and not line.startswith("#"))
+    if args.benchmark:
+        boards = [ChessEngine.parseFen(fen)[0] for fen in fens]
+        result = benchmark(boards)
+        print("%d positions: %.4fs one at a time, %.4fs batched, %.2fx, %d mismatches" % (result["positions"], result["singleSeconds"], result["batchSeconds"], result["speedup"], result["mismatches"]))
+        return 1 if result["mismatches"] else 0
+    outputFile = sys.stdout if args.output is None else open(args.output, "w")
+    errors = 0
+    for fen, score in evaluateFens(fens, args.batch):
+        if score is None:
+            errors += 1
+            outputFile.write(json.dumps({"fen": fen, "error": "bad FEN"}) + "\n")
+        else:
+            outputFile.write(json.dumps({"fen": fen, "score": score}) + "\n")
+    if inputFile is not sys.stdin:
+        inputFile.close()
+    if outputFile is not sys.stdout:
+        outputFile.close()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,618 @@
+#bitboard version of ChessEngine.GameState
+#each of the 12 piece types has its own 64 bit integer, bit r*8 + c is set when that piece is on row r, column c
+#it has the same makeMove/undoMove/getValidMoves api as ChessEngine.GameState and returns the same Move objects
+#self.board is kept in step with the bitboards so ChessMain.drawPieces and Move() can still read board[r][c]
+#self.board is read only, changing it will not change the bitboards
+#moves are generated set-wise: pawn pushes and captures by shifting the whole pawn bitboard, the other pieces from
+#precomputed attack sets, and only legal moves are made (a check mask and pin rays worked out once per position narrow the
+#targets down), so apart from en passant no move has to be tried on the board
+
+import ChessEngine
+import Evaluation
+
+pieceNames = ['wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK']
+pieceIndex = {name: i for i, name in enumerate(pieceNames)}
+
+rookDirections = ((-1, 0), (0, -1), (1, 0), (0, 1))
+bishopDirections = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+allDirections = rookDirections + bishopDirections
+
+fullBoard = (1 << 64) - 1
+
+
+#builds a bitboard of the squares reached by stepping once with each offset from row r, column c
+def stepAttacks(r, c, offsets):
+    attacks = 0
+    for m in offsets:
+        endRow = r + m[0]
+        endCol = c + m[1]
+        if 0 <= endRow < 8 and 0 <= endCol < 8:
+            attacks |= 1 << (endRow * 8 + endCol)
+    return attacks
+
+#builds the bitboard of every square from row r, column c to the edge of the board in direction d
+def rayAttacks(r, c, d):
+    ray = 0
+    for i in range(1, 8):
+        endRow = r + d[0] * i
+        endCol = c + d[1] * i
+        if not (0 <= endRow < 8 and 0 <= endCol < 8):
+            break
+        ray |= 1 << (endRow * 8 + endCol)
+    return ray
+
+knightAttacks = [stepAttacks(sq // 8, sq % 8, ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))) for sq in range(64)]
+kingAttacks = [stepAttacks(sq // 8, sq % 8, allDirections) for sq in range(64)]
+#pawnAttacks['w'][sq] is the squares a white pawn on sq attacks
+pawnAttacks = {'w': [stepAttacks(sq // 8, sq % 8, ((-1, -1), (-1, 1))) for sq in range(64)],
+               'b': [stepAttacks(sq // 8, sq % 8, ((1, -1), (1, 1))) for sq in range(64)]}
+#rays[d][sq] for each direction in allDirections, rayIncreasing[d] is True when the ray goes towards higher square numbers
+rays = [[rayAttacks(sq // 8, sq % 8, d) for sq in range(64)] for d in allDirections]
+rayIncreasing = [d[0] * 8 + d[1] > 0 for d in allDirections]
+#between[a][b] is the squares strictly between a and b when they share a row, column or diagonal, otherwise 0
+#a check from a slider can be blocked there, and a pinned piece can only move there or onto its pinner
+between = [[0] * 64 for sq in range(64)]
+for d in range(8):
+    for sq in range(64):
+        for target in range(64):
+            if (rays[d][sq] >> target) & 1:
+                between[sq][target] = rays[d][sq] ^ rays[d][target] ^ (1 << target)
+#each row as a bitboard, and every square off the first / last column (shifting a pawn there sideways would wrap it round
+#onto the next row)
+rowBits = [0xFF << (r * 8) for r in range(8)]
+notFirstColumn = fullBoard ^ sum(1 << (r * 8) for r in range(8))
+notLastColumn = fullBoard ^ sum(1 << (r * 8 + 7) for r in range(8))
+squareCoords = [(sq // 8, sq % 8) for sq in range(64)] #the (row, col) tuples Move() takes, made once
+
+
+#squares attacked along direction number d from sq, stopping at (and including) the first blocker in occupied
+def slide(d, sq, occupied):
+    ray = rays[d][sq]
+    blockers = ray & occupied
+    if blockers:
+        if rayIncreasing[d]:
+            first = (blockers & -blockers).bit_length() - 1
+        else:
+            first = blockers.bit_length() - 1
+        ray ^= rays[d][first]
+    return ray
+
+#only the pieces on a slider's rays short of the edge of the board can stop it, the attacks for each pattern of them are
+#kept once worked out so a rook or bishop's attacks are usually a single dictionary lookup
+def blockerMask(sq, directions):
+    mask = 0
+    for d in directions:
+        ray = rays[d][sq]
+        if ray:
+            edge = ray.bit_length() - 1 if rayIncreasing[d] else (ray & -ray).bit_length() - 1
+            mask |= ray ^ (1 << edge)
+    return mask
+
+rookBlockers = [blockerMask(sq, (0, 1, 2, 3)) for sq in range(64)]
+bishopBlockers = [blockerMask(sq, (4, 5, 6, 7)) for sq in range(64)]
+rookAttackCache = [{} for sq in range(64)]
+bishopAttackCache = [{} for sq in range(64)]
+
+def rookAttacks(sq, occupied):
+    blockers = occupied & rookBlockers[sq]
+    attacks = rookAttackCache[sq].get(blockers)
+    if attacks is None:
+        attacks = slide(0, sq, blockers) | slide(1, sq, blockers) | slide(2, sq, blockers) | slide(3, sq, blockers)
+        rookAttackCache[sq][blockers] = attacks
+    return attacks
+
+def bishopAttacks(sq, occupied):
+    blockers = occupied & bishopBlockers[sq]
+    attacks = bishopAttackCache[sq].get(blockers)
+    if attacks is None:
+        attacks = slide(4, sq, blockers) | slide(5, sq, blockers) | slide(6, sq, blockers) | slide(7, sq, blockers)
+        bishopAttackCache[sq][blockers] = attacks
+    return attacks
+
+
+class BitboardGameState():
+    def __init__(self):
+        self.board = [
+            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
+            ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
+            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
+        self.whiteToMove = True
+        self.moveLog = []
+        self.whiteKingLocation = (7, 4)
+        self.blackKingLocation = (0, 4)
+        self.checkMate = False
+        self.staleMate = False
+        self.isEnpassantMove = () #coordinates where en passant is possible
+        self.currentCastlingRight = ChessEngine.castleRightsByMask[15] #shared and never changed in place, like GameState
+        #one record per move in moveLog filled in place like GameState.undoStack: [castle rights mask, en passant square,
+        #zobrist key, material, middlegame, endgame, phase, halfmove clock]
+        self.undoStack = [[0, (), 0, 0, 0, 0, 0, 0] for ply in range(ChessEngine.UNDO_STACK_SIZE)]
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+        self.nullMoveDepth = 0 #null moves made and not undone yet, each one takes the undoStack record after the moves in moveLog
+        self.debugZobrist = False
+        self.debugEval = False
+        self.underpromotions = False #when True getValidMoves also gives rook, bishop and knight promotions
+        self.setBitboardsFromBoard()
+
+    #sets up the position from a FEN string, the move history is cleared
+    def loadFen(self, fen):
+        self.board, self.whiteToMove, castleRights, self.isEnpassantMove = ChessEngine.parseFen(fen)
+        self.currentCastlingRight = ChessEngine.castleRightsByMask[ChessEngine.castleRightsMask(castleRights)]
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.halfmoveClock, self.fullmoveNumber = ChessEngine.parseFenCounters(fen)
+        self.nullMoveDepth = 0
+        self.setBitboardsFromBoard()
+
+    def getFen(self):
+        return ChessEngine.boardToFen(self.board, self.whiteToMove, self.currentCastlingRight, self.isEnpassantMove) + " %d %d" % (self.halfmoveClock, self.fullmoveNumber)
+
+    #rebuilds every bitboard from self.board
+    def setBitboardsFromBoard(self):
+        self.pieceBitboards = [0] * 12
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.pieceBitboards[pieceIndex[piece]] |= 1 << (r * 8 + c)
+                    if piece == 'wK':
+                        self.whiteKingLocation = (r, c)
+                    elif piece == 'bK':
+                        self.blackKingLocation = (r, c)
+        self.updateOccupancy()
+        self.zobristKey = self.computeZobristKey()
+        self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase = Evaluation.evaluationTerms(self.board)
+
+    def computeZobristKey(self):
+        return ChessEngine.zobristHash(self.board, self.whiteToMove, self.currentCastlingRight, self.isEnpassantMove)
+
+    def checkZobristKey(self):
+        expected = self.computeZobristKey()
+        if self.zobristKey != expected:
+            raise RuntimeError("zobrist key %016x does not match recomputed key %016x after %d moves" % (self.zobristKey, expected, len(self.moveLog)))
+
+    def updateOccupancy(self):
+        bb = self.pieceBitboards
+        self.occupancy = {'w': bb[0] | bb[1] | bb[2] | bb[3] | bb[4] | bb[5],
+                          'b': bb[6] | bb[7] | bb[8] | bb[9] | bb[10] | bb[11]}
+        self.allPieces = self.occupancy['w'] | self.occupancy['b']
+
+    #moves piece from fromSq to the empty toSq on the bitboards and board (the castling rook), the key and evaluation are
+    #left to the caller
+    def shiftPiece(self, piece, fromSq, toSq):
+        self.pieceBitboards[pieceIndex[piece]] ^= (1 << fromSq) | (1 << toSq)
+        self.occupancy[piece[0]] ^= (1 << fromSq) | (1 << toSq)
+        self.board[fromSq // 8][fromSq % 8] = "--"
+        self.board[toSq // 8][toSq % 8] = piece
+
+    def makeMove(self, move):
+        ply = len(self.moveLog) + self.nullMoveDepth
+        if ply == len(self.undoStack):
+            self.undoStack.extend([[0, (), 0, 0, 0, 0, 0, 0] for i in range(ply)])
+        record = self.undoStack[ply]
+        castleMask = ChessEngine.castleRightsMask(self.currentCastlingRight)
+        record[0] = castleMask
+        record[1] = self.isEnpassantMove
+        record[2] = self.zobristKey
+        record[3] = self.evalMaterial
+        record[4] = self.evalMiddlegame
+        record[5] = self.evalEndgame
+        record[6] = self.evalPhase
+        record[7] = self.halfmoveClock
+        key = self.zobristKey ^ ChessEngine.zobristCastling[castleMask] ^ ChessEngine.zobristBlackToMove
+        if self.isEnpassantMove != ():
+            key ^= ChessEngine.zobristEnpassant[self.isEnpassantMove[1]]
+
+        #the moving piece (the promoted piece once it lands) and the captured piece change the bitboards, board, key and
+        #evaluation together
+        board = self.board
+        bb = self.pieceBitboards
+        occupancy = self.occupancy
+        zobristPieces = ChessEngine.zobristPieces
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        moved = move.pieceMoved
+        color = moved[0]
+        landed = color + move.promotionPiece if move.isPawnPromotion else moved
+        key ^= zobristPieces[moved][startSq] ^ zobristPieces[landed][endSq]
+        material = self.evalMaterial + Evaluation.materialValues[landed] - Evaluation.materialValues[moved]
+        middlegame = self.evalMiddlegame + Evaluation.middlegameValues[landed][endSq] - Evaluation.middlegameValues[moved][startSq]
+        endgame = self.evalEndgame + Evaluation.endgameValues[landed][endSq] - Evaluation.endgameValues[moved][startSq]
+        phase = self.evalPhase + Evaluation.phaseValues[landed] - Evaluation.phaseValues[moved]
+        captured = move.pieceCaptured
+        if captured != "--":
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            bb[pieceIndex[captured]] ^= 1 << capturedSq
+            occupancy[captured[0]] ^= 1 << capturedSq
+            board[capturedSq // 8][capturedSq % 8] = "--"
+            key ^= zobristPieces[captured][capturedSq]
+            material -= Evaluation.materialValues[captured]
+            middlegame -= Evaluation.middlegameValues[captured][capturedSq]
+            endgame -= Evaluation.endgameValues[captured][capturedSq]
+            phase -= Evaluation.phaseValues[captured]
+        bb[pieceIndex[moved]] ^= 1 << startSq
+        bb[pieceIndex[landed]] |= 1 << endSq
+        occupancy[color] ^= (1 << startSq) | (1 << endSq)
+        board[move.startRow][move.startCol] = "--"
+        board[move.endRow][move.endCol] = landed
+        if move.isCastleMove:
+            rook = color + 'R'
+            rookFrom, rookTo = (endSq + 1, endSq - 1) if move.endCol - move.startCol == 2 else (endSq - 2, endSq + 1)
+            self.shiftPiece(rook, rookFrom, rookTo)
+            key ^= zobristPieces[rook][rookFrom] ^ zobristPieces[rook][rookTo]
+            middlegame += Evaluation.middlegameValues[rook][rookTo] - Evaluation.middlegameValues[rook][rookFrom]
+            endgame += Evaluation.endgameValues[rook][rookTo] - Evaluation.endgameValues[rook][rookFrom]
+        self.allPieces = occupancy['w'] | occupancy['b']
+        self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase = material, middlegame, endgame, phase
+
+        if moved == 'wK':
+            self.whiteKingLocation = (move.endRow, move.endCol)
+        elif moved == 'bK':
+            self.blackKingLocation = (move.endRow, move.endCol)
+        if moved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
+            self.isEnpassantMove = ((move.startRow + move.endRow)//2, move.startCol)
+            key ^= ChessEngine.zobristEnpassant[move.startCol]
+        else:
+            self.isEnpassantMove = ()
+        #a king or rook moving, or a rook being captured, loses that side's castling
+        castleMask &= ChessEngine.castleRightsKeep[startSq] & ChessEngine.castleRightsKeep[endSq]
+        self.currentCastlingRight = ChessEngine.castleRightsByMask[castleMask]
+        self.zobristKey = key ^ ChessEngine.zobristCastling[castleMask]
+        self.moveLog.append(move)
+        self.whiteToMove = not self.whiteToMove
+        self.halfmoveClock = 0 if moved[1] == 'p' or captured != '--' else self.halfmoveClock + 1
+        if self.whiteToMove:
+            self.fullmoveNumber += 1
+        if self.debugZobrist:
+            self.checkZobristKey()
+        if self.debugEval:
+            self.checkEvaluation()
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog.pop()
+            self.whiteToMove = not self.whiteToMove
+            castleMask, self.isEnpassantMove, self.zobristKey, self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase, \
+                self.halfmoveClock = self.undoStack[len(self.moveLog) + self.nullMoveDepth]
+            self.currentCastlingRight = ChessEngine.castleRightsByMask[castleMask]
+            if not self.whiteToMove:
+                self.fullmoveNumber -= 1
+
+            #the key and evaluation came back with the record, so only the pieces are put back
+            board = self.board
+            bb = self.pieceBitboards
+            occupancy = self.occupancy
+            startSq = move.startRow * 8 + move.startCol
+            endSq = move.endRow * 8 + move.endCol
+            moved = move.pieceMoved
+            color = moved[0]
+            bb[pieceIndex[board[move.endRow][move.endCol]]] ^= 1 << endSq
+            bb[pieceIndex[moved]] |= 1 << startSq
+            occupancy[color] ^= (1 << startSq) | (1 << endSq)
+            board[move.startRow][move.startCol] = moved
+            board[move.endRow][move.endCol] = "--"
+            captured = move.pieceCaptured
+            if captured != "--":
+                capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+                bb[pieceIndex[captured]] |= 1 << capturedSq
+                occupancy[captured[0]] |= 1 << capturedSq
+                board[capturedSq // 8][capturedSq % 8] = captured
+            if move.isCastleMove:
+                rookFrom, rookTo = (endSq + 1, endSq - 1) if move.endCol - move.startCol == 2 else (endSq - 2, endSq + 1)
+                self.shiftPiece(color + 'R', rookTo, rookFrom)
+            self.allPieces = occupancy['w'] | occupancy['b']
+
+            if moved == 'wK':
+                self.whiteKingLocation = (move.startRow, move.startCol)
+            elif moved == 'bK':
+                self.blackKingLocation = (move.startRow, move.startCol)
+            if self.debugZobrist:
+                self.checkZobristKey()
+            if self.debugEval:
+                self.checkEvaluation()
+            self.checkMate = False
+            self.staleMate = False
+
+    #passes the turn without moving a piece, like GameState.makeNullMove
+    def makeNullMove(self):
+        #only the en passant square and zobrist key change, they go in the next undo record like a move's do
+        ply = len(self.moveLog) + self.nullMoveDepth
+        if ply == len(self.undoStack):
+            self.undoStack.extend([[0, (), 0, 0, 0, 0, 0, 0] for i in range(ply)])
+        record = self.undoStack[ply]
+        record[1] = self.isEnpassantMove
+        record[2] = self.zobristKey
+        self.nullMoveDepth += 1
+        if self.isEnpassantMove != ():
+            self.zobristKey ^= ChessEngine.zobristEnpassant[self.isEnpassantMove[1]]
+            self.isEnpassantMove = ()
+        self.zobristKey ^= ChessEngine.zobristBlackToMove
+        self.whiteToMove = not self.whiteToMove
+
+    def undoNullMove(self):
+        self.nullMoveDepth -= 1
+        record = self.undoStack[len(self.moveLog) + self.nullMoveDepth]
+        self.isEnpassantMove = record[1]
+        self.zobristKey = record[2]
+        self.whiteToMove = not self.whiteToMove
+
+    #bitboard of the pieces of attackerColor that attack sq, with the board occupancy given by occupied
+    def attackersTo(self, sq, attackerColor, occupied):
+        bb = self.pieceBitboards
+        offset = 0 if attackerColor == 'w' else 6
+        defenderColor = 'b' if attackerColor == 'w' else 'w'
+        attackers = knightAttacks[sq] & bb[offset + 1]
+        attackers |= kingAttacks[sq] & bb[offset + 5]
+        attackers |= pawnAttacks[defenderColor][sq] & bb[offset] #a pawn attacks sq if a defending pawn on sq would attack it
+        rooksQueens = bb[offset + 3] | bb[offset + 4]
+        if rooksQueens:
+            attackers |= rookAttacks(sq, occupied) & rooksQueens
+        bishopsQueens = bb[offset + 2] | bb[offset + 4]
+        if bishopsQueens:
+            attackers |= bishopAttacks(sq, occupied) & bishopsQueens
+        return attackers
+
+    def squareUnderAttack(self, r, c):
+        return self.attackersTo(r * 8 + c, 'b' if self.whiteToMove else 'w', self.allPieces) != 0
+
+    def inCheck(self):
+        if self.whiteToMove:
+            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
+        else:
+            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
+
+    #static evaluation in pawns, positive is good for white
+    def evaluate(self):
+        return Evaluation.combineTerms(self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase)
+
+    def checkEvaluation(self):
+        expected = Evaluation.evaluationTerms(self.board)
+        actual = (self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase)
+        if actual != expected:
+            raise RuntimeError("evaluation totals %s do not match recomputed %s after %d moves" % (actual, expected, len(self.moveLog)))
+
+    #adds a Move for every set bit in targets from square sq
+    def addMoves(self, sq, targets, moves):
+        board = self.board
+        start = squareCoords[sq]
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            moves.append(ChessEngine.Move(start, squareCoords[bit.bit_length() - 1], board))
+
+    #adds a pawn Move to every set bit in targets, each from the square shift squares back (targets is the pawn bitboard
+    #shifted by shift), promotionPieces gives the pieces to promote to (a queen when it is None)
+    def addPawnMoves(self, targets, shift, moves, promotionPieces=None):
+        board = self.board
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            endSq = bit.bit_length() - 1
+            start, end = squareCoords[endSq - shift], squareCoords[endSq]
+            if promotionPieces is None:
+                moves.append(ChessEngine.Move(start, end, board))
+            else:
+                for promotionPiece in promotionPieces:
+                    moves.append(ChessEngine.Move(start, end, board, promotionPiece=promotionPiece))
+
+    #pushes and captures of every pawn on the pawns bitboard at once by shifting the bitboard, the pawns can only move to
+    #squares on allowed (from the check mask and pin ray), en passant isn't included
+    #capturesOnly/quietsOnly split the moves the same way as getLegalMoves
+    def getPawnMoves(self, pawns, allowed, capturesOnly, quietsOnly, moves):
+        empty = ~self.allPieces & fullBoard
+        if self.whiteToMove:
+            enemy = self.occupancy['b']
+            single = (pawns >> 8) & empty
+            double = ((single & rowBits[5]) >> 8) & empty & allowed
+            left = ((pawns & notFirstColumn) >> 9) & enemy & allowed
+            right = ((pawns & notLastColumn) >> 7) & enemy & allowed
+            forward, leftShift, rightShift, lastRow = -8, -9, -7, rowBits[0]
+        else:
+            enemy = self.occupancy['w']
+            single = (pawns << 8) & empty
+            double = ((single & rowBits[2]) << 8) & empty & allowed
+            left = ((pawns & notFirstColumn) << 7) & enemy & allowed
+            right = ((pawns & notLastColumn) << 9) & enemy & allowed
+            forward, leftShift, rightShift, lastRow = 8, 7, 9, rowBits[7]
+        single &= allowed #after the double pushes, they only need the square in front to be empty
+
+        if quietsOnly:
+            self.addPawnMoves(single & ~lastRow, forward, moves)
+            self.addPawnMoves(double, 2 * forward, moves)
+            if self.underpromotions:
+                for targets, shift in ((single & lastRow, forward), (left & lastRow, leftShift), (right & lastRow, rightShift)):
+                    self.addPawnMoves(targets, shift, moves, ('R', 'B', 'N'))
+            return
+        self.addPawnMoves(left & ~lastRow, leftShift, moves)
+        self.addPawnMoves(right & ~lastRow, rightShift, moves)
+        if capturesOnly:
+            for targets, shift in ((single & lastRow, forward), (left & lastRow, leftShift), (right & lastRow, rightShift)):
+                self.addPawnMoves(targets, shift, moves)
+            return
+        self.addPawnMoves(single & ~lastRow, forward, moves)
+        self.addPawnMoves(double, 2 * forward, moves)
+        promotionPieces = ('Q', 'R', 'B', 'N') if self.underpromotions else None
+        for targets, shift in ((single & lastRow, forward), (left & lastRow, leftShift), (right & lastRow, rightShift)):
+            self.addPawnMoves(targets, shift, moves, promotionPieces)
+
+    #the legal moves apart from castling, only moves that keep the king safe are made: the king steps to squares nothing
+    #attacks, in check the other pieces can only capture the checker or block it (nothing but the king in double check),
+    #and pinned pieces stay on the line to their pinner, en passant is the one move still tried on the board
+    #capturesOnly keeps just the captures and queen promotions (for the quiescence search)
+    #quietsOnly keeps the rest: moves to empty squares other than queen promotions, plus the rook, bishop and knight
+    #promotions when underpromotions is on
+    #fromSquares is a bitboard of the squares whose pieces are moved (all of them by default)
+    def getLegalMoves(self, legality, capturesOnly=False, quietsOnly=False, fromSquares=fullBoard):
+        kingSq, checkers, checkMask, pins = legality
+        moves = []
+        bb = self.pieceBitboards
+        if self.whiteToMove:
+            color, enemyColor, offset = 'w', 'b', 0
+        else:
+            color, enemyColor, offset = 'b', 'w', 6
+        targetMask = self.occupancy[enemyColor] if capturesOnly else ~self.allPieces & fullBoard if quietsOnly else ~self.occupancy[color]
+
+        if checkMask: #in double check only the king can move
+            pinned = 0
+            for sq in pins:
+                pinned |= 1 << sq
+            #pawns, the unpinned ones all together and each pinned one with its own pin ray
+            pawns = bb[offset] & fromSquares
+            self.getPawnMoves(pawns & ~pinned, checkMask, capturesOnly, quietsOnly, moves)
+            for sq in pins:
+                if (pawns >> sq) & 1:
+                    self.getPawnMoves(1 << sq, checkMask & pins[sq], capturesOnly, quietsOnly, moves)
+            #knights (a pinned knight can never move), bishops, rooks and queens
+            pieceTargets = targetMask & checkMask
+            knights = bb[offset + 1] & fromSquares & ~pinned
+            while knights:
+                bit = knights & -knights
+                knights ^= bit
+                sq = bit.bit_length() - 1
+                self.addMoves(sq, knightAttacks[sq] & pieceTargets, moves)
+            for index in (2, 3, 4):
+                pieces = bb[offset + index] & fromSquares
+                while pieces:
+                    bit = pieces & -pieces
+                    pieces ^= bit
+                    sq = bit.bit_length() - 1
+                    if index == 2:
+                        targets = bishopAttacks(sq, self.allPieces)
+                    elif index == 3:
+                        targets = rookAttacks(sq, self.allPieces)
+                    else:
+                        targets = rookAttacks(sq, self.allPieces) | bishopAttacks(sq, self.allPieces)
+                    targets &= pieceTargets
+                    if bit & pinned:
+                        targets &= pins[sq]
+                    self.addMoves(sq, targets, moves)
+
+        #en passant takes two pieces off the same row, which the pin rays don't cover, so make it and look
+        if not quietsOnly and self.isEnpassantMove != ():
+            epRow, epCol = self.isEnpassantMove
+            capturers = pawnAttacks[enemyColor][epRow * 8 + epCol] & bb[offset] & fromSquares
+            while capturers:
+                bit = capturers & -capturers
+                capturers ^= bit
+                move = ChessEngine.Move(squareCoords[bit.bit_length() - 1], self.isEnpassantMove, self.board, isEmpassantMove=True)
+                self.makeMove(move)
+                self.whiteToMove = not self.whiteToMove
+                if not self.inCheck():
+                    moves.append(move)
+                self.whiteToMove = not self.whiteToMove
+                self.undoMove()
+
+        #the king, to squares the enemy doesn't attack once the king has left its square (so it can't step back along a check)
+        if (fromSquares >> kingSq) & 1:
+            occupiedWithoutKing = self.allPieces ^ (1 << kingSq)
+            targets = kingAttacks[kingSq] & targetMask
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                if not self.attackersTo(bit.bit_length() - 1, enemyColor, occupiedWithoutKing):
+                    self.addMoves(kingSq, bit, moves)
+        return moves
+
+    def getCastleMoves(self, r, c, moves):
+        rights = self.currentCastlingRight
+        color = 'w' if self.whiteToMove else 'b'
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        if (self.whiteToMove and rights.wks) or (not self.whiteToMove and rights.bks):
+            if self.board[r][c+1] == '--' and self.board[r][c+2] == '--' and self.board[r][c+3] == color + 'R':
+                if not self.attackersTo(r * 8 + c + 1, enemyColor, self.allPieces) and not self.attackersTo(r * 8 + c + 2, enemyColor, self.allPieces):
+                    moves.append(ChessEngine.Move((r, c), (r, c+2), self.board, isCastleMove=True))
+        if (self.whiteToMove and rights.wqs) or (not self.whiteToMove and rights.bqs):
+            if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--' and self.board[r][c-4] == color + 'R':
+                if not self.attackersTo(r * 8 + c - 1, enemyColor, self.allPieces) and not self.attackersTo(r * 8 + c - 2, enemyColor, self.allPieces):
+                    moves.append(ChessEngine.Move((r, c), (r, c-2), self.board, isCastleMove=True))
+
+    #our pieces pinned to the king on kingSq: pinned square -> bitboard of the squares it can still move to (the line up to
+    #and including the pinner)
+    def getPins(self, kingSq, color, enemyColor):
+        bb = self.pieceBitboards
+        offset = 0 if enemyColor == 'w' else 6
+        queens = bb[offset + 4]
+        pinners = (rookAttacks(kingSq, 0) & (bb[offset + 3] | queens)) | (bishopAttacks(kingSq, 0) & (bb[offset + 2] | queens))
+        pins = {}
+        while pinners:
+            bit = pinners & -pinners
+            pinners ^= bit
+            line = between[kingSq][bit.bit_length() - 1]
+            blockers = line & self.allPieces
+            if blockers and not blockers & (blockers - 1) and blockers & self.occupancy[color]: #exactly one piece in the way, ours
+                pins[blockers.bit_length() - 1] = line | bit
+        return pins
+
+    #staged move generation (MoveOrdering.MoveOrderer.stagedMoves), the stages together give the same moves as getValidMoves
+    #returns (inCheck, legality), legality is (king square, checkers bitboard, check mask, pins from getPins), worked out
+    #once per node, the check mask is the squares the other pieces can move to (everything out of check, 0 in double check)
+    def getLegality(self):
+        if self.whiteToMove:
+            color, enemyColor = 'w', 'b'
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            color, enemyColor = 'b', 'w'
+            kingRow, kingCol = self.blackKingLocation
+        kingSq = kingRow * 8 + kingCol
+        checkers = self.attackersTo(kingSq, enemyColor, self.allPieces)
+        if not checkers:
+            checkMask = fullBoard
+        elif checkers & (checkers - 1):
+            checkMask = 0
+        else: #take the checker or, if it is a slider, block it
+            checkMask = checkers | between[kingSq][checkers.bit_length() - 1]
+        return checkers != 0, (kingSq, checkers, checkMask, self.getPins(kingSq, color, enemyColor))
+
+    def getValidMoves(self):
+        inCheck, legality = self.getLegality()
+        moves = self.getLegalMoves(legality)
+        if not inCheck:
+            kingSq = legality[0]
+            self.getCastleMoves(kingSq // 8, kingSq % 8, moves)
+
+        if len(moves) == 0:
+            if inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        return moves
+
+    #only the legal captures and queen promotions, checkMate/staleMate are left alone
+    def getValidCaptures(self):
+        return self.getLegalMoves(self.getLegality()[1], capturesOnly=True)
+
+    #legal captures and queen promotions
+    def getLegalCaptures(self, legality):
+        return self.getLegalMoves(legality, capturesOnly=True)
+
+    #every legal move getLegalCaptures leaves out, castling included
+    def getLegalQuietMoves(self, legality):
+        moves = self.getLegalMoves(legality, quietsOnly=True)
+        kingSq, checkers = legality[0], legality[1]
+        if not checkers:
+            self.getCastleMoves(kingSq // 8, kingSq % 8, moves)
+        return moves
+
+    #the Move with this moveID if it is legal here, otherwise None, only the piece on the start square is generated
+    def getLegalMove(self, moveID, legality):
+        kingSq, checkers = legality[0], legality[1]
+        startSq = moveID & 63
+        if not (self.occupancy['w' if self.whiteToMove else 'b'] >> startSq) & 1:
+            return None
+        moves = self.getLegalMoves(legality, fromSquares=1 << startSq)
+        if startSq == kingSq and not checkers:
+            self.getCastleMoves(kingSq // 8, kingSq % 8, moves)
+        for move in moves:
+            if move.moveID == moveID:
+                return move
+        return None
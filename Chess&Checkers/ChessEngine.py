@@ -1,3 +1,157 @@
+import random
+import time
+import Evaluation
+
+#zobrist keys, one random 64 bit number for every piece on every square and for each part of the game state
+#a position's key is all of its numbers xor'd together, so a move only has to xor in the parts that change
+#the seed is fixed so the same position always gets the same key (opening books depend on this)
+zobristRandom = random.Random(20250105)
+zobristPieces = {piece: [zobristRandom.getrandbits(64) for sq in range(64)] for piece in ['wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK']}
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = [zobristRandom.getrandbits(64) for mask in range(16)] #indexed by castleRightsMask
+zobristEnpassant = [zobristRandom.getrandbits(64) for col in range(8)] #indexed by the en passant column
+
+#packs castle rights into 4 bits: 1 = white king side, 2 = white queen side, 4 = black king side, 8 = black queen side
+def castleRightsMask(rights):
+    return (1 if rights.wks else 0) | (2 if rights.wqs else 0) | (4 if rights.bks else 0) | (8 if rights.bqs else 0)
+
+#castle rights kept by a move from or to each square (r*8 + c): moving the king or a rook, or capturing a rook on its
+#starting square, loses those rights, new rights = old mask & castleRightsKeep[start] & castleRightsKeep[end]
+castleRightsKeep = [15] * 64
+castleRightsKeep[7 * 8 + 4] = 15 & ~3 #white king
+castleRightsKeep[7 * 8 + 0] = 15 & ~2 #white queen side rook
+castleRightsKeep[7 * 8 + 7] = 15 & ~1 #white king side rook
+castleRightsKeep[0 * 8 + 4] = 15 & ~12 #black king
+castleRightsKeep[0 * 8 + 0] = 15 & ~8 #black queen side rook
+castleRightsKeep[0 * 8 + 7] = 15 & ~4 #black king side rook
+
+UNDO_STACK_SIZE = 256 #undo records made up front, the stack doubles if a game gets longer than this
+
+#builds a zobrist key from scratch
+def zobristHash(board, whiteToMove, castleRights, enpassant):
+    key = 0
+    for r in range(8):
+        for c in range(8):
+            if board[r][c] != "--":
+                key ^= zobristPieces[board[r][c]][r * 8 + c]
+    if not whiteToMove:
+        key ^= zobristBlackToMove
+    key ^= zobristCastling[castleRightsMask(castleRights)]
+    if enpassant != ():
+        key ^= zobristEnpassant[enpassant[1]]
+    return key
+
+#reads the first four fields of a FEN string
+#returns (board, whiteToMove, castle rights, en passant square) in the same form GameState uses
+def parseFen(fen):
+    fields = fen.split()
+    rows = fields[0].split('/')
+    if len(rows) != 8:
+        raise ValueError("FEN board needs 8 rows: " + fen)
+    board = []
+    for row in rows:
+        boardRow = []
+        for ch in row:
+            if ch.isdigit():
+                boardRow.extend(["--"] * int(ch))
+            elif ch.upper() in "PNBRQK":
+                boardRow.append(('w' if ch.isupper() else 'b') + ('p' if ch.upper() == 'P' else ch.upper()))
+            else:
+                raise ValueError("bad FEN piece '" + ch + "': " + fen)
+        if len(boardRow) != 8:
+            raise ValueError("FEN row '" + row + "' is not 8 squares: " + fen)
+        board.append(boardRow)
+    if 'wp' in board[0] or 'bp' in board[0] or 'wp' in board[7] or 'bp' in board[7]: #a pawn there has already promoted
+        raise ValueError("FEN has a pawn on the first or last rank: " + fen)
+    for king in ('wK', 'bK'): #the move generator and search expect exactly one king a side
+        kings = sum(row.count(king) for row in board)
+        if kings != 1:
+            raise ValueError("FEN needs one %s king, it has %d: %s" % ("white" if king == 'wK' else "black", kings, fen))
+    whiteToMove = len(fields) < 2 or fields[1] == 'w'
+    castling = fields[2] if len(fields) > 2 else '-'
+    castleRights = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+    enpassant = ()
+    if len(fields) > 3 and fields[3] != '-':
+        enpassant = (Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]])
+    return board, whiteToMove, castleRights, enpassant
+
+#writes the first four fields of a FEN string, the opposite of parseFen
+def boardToFen(board, whiteToMove, castleRights, enpassant):
+    rows = []
+    for row in board:
+        text = ""
+        empty = 0
+        for square in row:
+            if square == "--":
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            letter = 'P' if square[1] == 'p' else square[1]
+            text += letter if square[0] == 'w' else letter.lower()
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    castling = ('K' if castleRights.wks else '') + ('Q' if castleRights.wqs else '') + \
+               ('k' if castleRights.bks else '') + ('q' if castleRights.bqs else '')
+    enpassantSquare = Move.colsToFiles[enpassant[1]] + Move.rowsToRanks[enpassant[0]] if enpassant != () else '-'
+    return ' '.join(['/'.join(rows), 'w' if whiteToMove else 'b', castling or '-', enpassantSquare])
+
+#reads the last two fields of a FEN string, (halfmove clock, fullmove number)
+#they are optional (EPD lines and short FENs leave them out), missing or non-numeric fields give (0, 1)
+def parseFenCounters(fen):
+    fields = fen.split()
+    halfmoveClock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+    fullmoveNumber = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    return halfmoveClock, max(fullmoveNumber, 1)
+
+#adds rook, bishop and knight versions of every queen promotion in moves (right after the queen promotion)
+def addUnderpromotions(moves, board):
+    allMoves = []
+    for move in moves:
+        allMoves.append(move)
+        if move.isPawnPromotion:
+            for piece in ('R', 'B', 'N'):
+                allMoves.append(Move((move.startRow, move.startCol), (move.endRow, move.endCol), board, promotionPiece=piece))
+    return allMoves
+
+#piece move offsets used by getAllPossibleCaptures and getAllPossibleQuietMoves
+knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+slidingDirections = {'R': ((-1, 0), (0, -1), (1, 0), (0, 1)),
+                     'B': ((-1, -1), (-1, 1), (1, -1), (1, 1)),
+                     'Q': ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))}
+
+#the (row, col) squares reached by one step with each offset from row r, column c that are on the board
+def stepTargets(r, c, offsets):
+    return tuple((r + m[0], c + m[1]) for m in offsets if 0 <= r + m[0] < 8 and 0 <= c + m[1] < 8)
+
+#the (row, col) squares from row r, column c to the edge of the board in direction d, nearest first
+def rayTargets(r, c, d):
+    ray = []
+    endRow, endCol = r + d[0], c + d[1]
+    while 0 <= endRow < 8 and 0 <= endCol < 8:
+        ray.append((endRow, endCol))
+        endRow += d[0]
+        endCol += d[1]
+    return tuple(ray)
+
+#move tables, built once here so the generators walk tuples of target squares instead of adding offsets and checking bounds
+#all of them are indexed by the square r*8 + c
+moveTableStart = time.perf_counter()
+knightTargets = [stepTargets(sq // 8, sq % 8, knightMoves) for sq in range(64)]
+kingTargets = [stepTargets(sq // 8, sq % 8, kingMoves) for sq in range(64)]
+#a ray for each of the piece's slidingDirections, in the same order (the queen's are the rook's then the bishop's)
+slidingRays = {piece: [tuple(rayTargets(sq // 8, sq % 8, d) for d in directions) for sq in range(64)] for piece, directions in slidingDirections.items()}
+#pawn pushes (one square, then two from the starting row) and captures (left then right) for each color
+pawnPushes = {'w': [stepTargets(sq // 8, sq % 8, ((-1, 0), (-2, 0)) if sq // 8 == 6 else ((-1, 0),)) for sq in range(64)],
+              'b': [stepTargets(sq // 8, sq % 8, ((1, 0), (2, 0)) if sq // 8 == 1 else ((1, 0),)) for sq in range(64)]}
+pawnCaptures = {'w': [stepTargets(sq // 8, sq % 8, ((-1, -1), (-1, 1))) for sq in range(64)],
+                'b': [stepTargets(sq // 8, sq % 8, ((1, -1), (1, 1))) for sq in range(64)]}
+moveTableSeconds = time.perf_counter() - moveTableStart #reported by Perft
+
+
 class GameState():
     def __init__(self):
         #board is a 8x8 2d list
@@ -15,7 +169,7 @@ class GameState():
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves, 'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+        self.bindMoveFunctions()
 
         self.whiteToMove = True
         self.moveLog = []
@@ -24,16 +178,86 @@ class GameState():
         self.checkMate = False
         self.staleMate = False
         self.isEnpassantMove = () #coordinates where en passant is possible
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        self.currentCastlingRight = castleRightsByMask[15] #shared and never changed in place, makeMove swaps in another one
+        #zobrist key of the current position, updated by makeMove and restored by undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.debugZobrist = False #when True every makeMove/undoMove checks the key against a full recompute
+        self.underpromotions = False #when True getValidMoves also gives rook, bishop and knight promotions (the game only uses queens)
+        #evaluation totals (material, middlegame table, endgame table, phase), updated by makeMove and restored by undoMove
+        self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase = Evaluation.evaluationTerms(self.board)
+        self.debugEval = False #when True every makeMove/undoMove checks the totals against a full recompute
+        #moves since the last capture or pawn move, and the move number (goes up after black moves), for FEN strings
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+        #one record per move in moveLog (and per null move, see makeNullMove) with the state makeMove can't work backwards from,
+        #filled in place so making a move doesn't allocate: [castle rights mask, en passant square, zobrist key, material,
+        #middlegame, endgame, phase, halfmove clock]
+        self.undoStack = [[0, (), 0, 0, 0, 0, 0, 0] for ply in range(UNDO_STACK_SIZE)]
+        self.nullMoveDepth = 0 #null moves made and not undone yet, each one takes the undoStack record after the moves in moveLog
+
+    #the move function for each piece type, bound once so getAllPossibleMoves doesn't look them up for every piece
+    #call it again after the methods are replaced (Profiler.enable) for this game state to use the new ones
+    def bindMoveFunctions(self):
+        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves, 'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+
+    #sets up the position from a FEN string, the move history is cleared
+    def loadFen(self, fen):
+        self.board, self.whiteToMove, castleRights, self.isEnpassantMove = parseFen(fen)
+        self.currentCastlingRight = castleRightsByMask[castleRightsMask(castleRights)]
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == 'wK':
+                    self.whiteKingLocation = (r, c)
+                elif self.board[r][c] == 'bK':
+                    self.blackKingLocation = (r, c)
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.zobristKey = self.computeZobristKey()
+        self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase = Evaluation.evaluationTerms(self.board)
+        self.halfmoveClock, self.fullmoveNumber = parseFenCounters(fen)
+        self.nullMoveDepth = 0
+
+    #FEN string of the current position, the opposite of loadFen
+    def getFen(self):
+        return boardToFen(self.board, self.whiteToMove, self.currentCastlingRight, self.isEnpassantMove) + " %d %d" % (self.halfmoveClock, self.fullmoveNumber)
 
 
     #takes a move and executes it (will not work with castling, pawn promotion, and en-passent)
     def makeMove(self, move):
+        #save what undoMove needs into this ply's record
+        ply = len(self.moveLog) + self.nullMoveDepth
+        if ply == len(self.undoStack):
+            self.undoStack.extend([[0, (), 0, 0, 0, 0, 0, 0] for i in range(ply)])
+        record = self.undoStack[ply]
+        castleMask = castleRightsMask(self.currentCastlingRight)
+        record[0] = castleMask
+        record[1] = self.isEnpassantMove
+        record[2] = self.zobristKey
+        record[3] = self.evalMaterial
+        record[4] = self.evalMiddlegame
+        record[5] = self.evalEndgame
+        record[6] = self.evalPhase
+        record[7] = self.halfmoveClock
+
+        #take the old castle rights, en passant column and moving piece out of the zobrist key
+        key = self.zobristKey ^ zobristCastling[castleMask] ^ zobristBlackToMove
+        if self.isEnpassantMove != ():
+            key ^= zobristEnpassant[self.isEnpassantMove[1]]
+        key ^= zobristPieces[move.pieceMoved][move.startRow * 8 + move.startCol]
+        if move.isEnpassantMove:
+            key ^= zobristPieces[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            key ^= zobristPieces[move.pieceCaptured][move.endRow * 8 + move.endCol]
+
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.moveLog.append(move)#log the move so we can undo it later
         self.whiteToMove = not self.whiteToMove #swaps the player that can move
+        #update the FEN move counters
+        self.halfmoveClock = 0 if move.pieceMoved[1] == 'p' or move.pieceCaptured != '--' else self.halfmoveClock + 1
+        if self.whiteToMove: #black just moved
+            self.fullmoveNumber += 1
         #update king's location
         if move.pieceMoved == 'wK':
             self.whiteKingLocation = (move.endRow, move.endCol)
@@ -42,7 +266,7 @@ class GameState():
 
         #pawn Promotion
         if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotionPiece
 
         #en passant
         if move.isEnpassantMove:
@@ -64,17 +288,39 @@ class GameState():
                 self.board[move.endRow][move.endCol-2] = '--'
                 
                 #update castling rights - whenever there is a rook or king move
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
+        castleMask &= castleRightsKeep[move.startRow * 8 + move.startCol] & castleRightsKeep[move.endRow * 8 + move.endCol]
+        self.currentCastlingRight = castleRightsByMask[castleMask]
+
+        #put the piece that landed, the castled rook and the new castle rights/en passant column into the key
+        key ^= zobristPieces[self.board[move.endRow][move.endCol]][move.endRow * 8 + move.endCol]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2:
+                key ^= zobristPieces[rook][move.endRow * 8 + move.endCol + 1] ^ zobristPieces[rook][move.endRow * 8 + move.endCol - 1]
+            else:
+                key ^= zobristPieces[rook][move.endRow * 8 + move.endCol - 2] ^ zobristPieces[rook][move.endRow * 8 + move.endCol + 1]
+        key ^= zobristCastling[castleMask]
+        if self.isEnpassantMove != ():
+            key ^= zobristEnpassant[self.isEnpassantMove[1]]
+        self.zobristKey = key
+        if self.debugZobrist:
+            self.checkZobristKey()
+        self.updateEvaluation(move)
 
 
     #undoing a move
     def undoMove(self):
         if len(self.moveLog) != 0: #make sure there is a move to undo
             move = self.moveLog.pop()
+            #everything makeMove saved comes straight back from the record
+            castleMask, self.isEnpassantMove, self.zobristKey, self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase, \
+                self.halfmoveClock = self.undoStack[len(self.moveLog) + self.nullMoveDepth]
+            self.currentCastlingRight = castleRightsByMask[castleMask]
             self.board[move.startRow][move.startCol] = move.pieceMoved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
             self.whiteToMove = not self.whiteToMove #swaps the turns
+            if not self.whiteToMove: #undoing black's move
+                self.fullmoveNumber -= 1
             #update king's position
             if move.pieceMoved == 'wK':
                 self.whiteKingLocation = (move.startRow, move.startCol)
@@ -84,14 +330,6 @@ class GameState():
             if move.isEnpassantMove:
                 self.board[move.endRow][move.endCol] = '--' #leave landing square blank
                 self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.isEnpassantMove = (move.endRow, move.endCol)
-            #undo 2 square pawn advance
-            if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-                self.isEnpassantMove = ()
-
-            #undo castling rights
-            self.castleRightsLog.pop() #get rid of new castling rights from move we are doing
-            self.currentCastlingRight = self.castleRightsLog[-1] #set the current castle rights to the last one in the list
 
             #undo castle move
             if move.isCastleMove:
@@ -101,62 +339,277 @@ class GameState():
                 else: #queen side
                     self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
                     self.board[move.endRow][move.endCol+1] = '--'
+
+            if self.debugZobrist:
+                self.checkZobristKey()
+            if self.debugEval:
+                self.checkEvaluation()
             self.checkMate = False
             self.staleMate = False
 
 
-    #update castle rights given the move
-    def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0: #left rook
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7: #right rook
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0: #left rook
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7: #right rook
-                    self.currentCastlingRight.bks = False
-        
+    #passes the turn without moving a piece (null move pruning in the search), the en passant square is lost
+    #undo it with undoNullMove before undoing the moves made before it
+    def makeNullMove(self):
+        #only the en passant square and zobrist key change, they go in the next undo record like a move's do
+        ply = len(self.moveLog) + self.nullMoveDepth
+        if ply == len(self.undoStack):
+            self.undoStack.extend([[0, (), 0, 0, 0, 0, 0, 0] for i in range(ply)])
+        record = self.undoStack[ply]
+        record[1] = self.isEnpassantMove
+        record[2] = self.zobristKey
+        self.nullMoveDepth += 1
+        if self.isEnpassantMove != ():
+            self.zobristKey ^= zobristEnpassant[self.isEnpassantMove[1]]
+            self.isEnpassantMove = ()
+        self.zobristKey ^= zobristBlackToMove
+        self.whiteToMove = not self.whiteToMove
+
+    def undoNullMove(self):
+        self.nullMoveDepth -= 1
+        record = self.undoStack[len(self.moveLog) + self.nullMoveDepth]
+        self.isEnpassantMove = record[1]
+        self.zobristKey = record[2]
+        self.whiteToMove = not self.whiteToMove
+
+    #changes the evaluation totals for a move that has just been made on the board
+    def updateEvaluation(self, move):
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        landed = self.board[move.endRow][move.endCol] #the promoted piece for a promotion
+        material = self.evalMaterial + Evaluation.materialValues[landed] - Evaluation.materialValues[move.pieceMoved]
+        middlegame = self.evalMiddlegame + Evaluation.middlegameValues[landed][endSq] - Evaluation.middlegameValues[move.pieceMoved][startSq]
+        endgame = self.evalEndgame + Evaluation.endgameValues[landed][endSq] - Evaluation.endgameValues[move.pieceMoved][startSq]
+        phase = self.evalPhase + Evaluation.phaseValues[landed] - Evaluation.phaseValues[move.pieceMoved]
+        if move.pieceCaptured != "--":
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            material -= Evaluation.materialValues[move.pieceCaptured]
+            middlegame -= Evaluation.middlegameValues[move.pieceCaptured][capturedSq]
+            endgame -= Evaluation.endgameValues[move.pieceCaptured][capturedSq]
+            phase -= Evaluation.phaseValues[move.pieceCaptured]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2:
+                rookFrom, rookTo = endSq + 1, endSq - 1
+            else:
+                rookFrom, rookTo = endSq - 2, endSq + 1
+            middlegame += Evaluation.middlegameValues[rook][rookTo] - Evaluation.middlegameValues[rook][rookFrom]
+            endgame += Evaluation.endgameValues[rook][rookTo] - Evaluation.endgameValues[rook][rookFrom]
+        self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase = material, middlegame, endgame, phase
+        if self.debugEval:
+            self.checkEvaluation()
+
+    #static evaluation in pawns, positive is good for white, doesn't look at the board so it is O(1)
+    def evaluate(self):
+        return Evaluation.combineTerms(self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase)
+
+    #debug check that the incrementally updated totals match a full recompute
+    def checkEvaluation(self):
+        expected = Evaluation.evaluationTerms(self.board)
+        actual = (self.evalMaterial, self.evalMiddlegame, self.evalEndgame, self.evalPhase)
+        if actual != expected:
+            raise RuntimeError("evaluation totals %s do not match recomputed %s after %d moves" % (actual, expected, len(self.moveLog)))
+
+    #zobrist key of the current position built from scratch
+    def computeZobristKey(self):
+        return zobristHash(self.board, self.whiteToMove, self.currentCastlingRight, self.isEnpassantMove)
+
+    #debug check that the incrementally updated key matches a full recompute
+    def checkZobristKey(self):
+        expected = self.computeZobristKey()
+        if self.zobristKey != expected:
+            raise RuntimeError("zobrist key %016x does not match recomputed key %016x after %d moves" % (self.zobristKey, expected, len(self.moveLog)))
 
     def getValidMoves(self):
-        tempEnpassantPossible = self.isEnpassantMove
-        tempCastleRights = (CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)) #copy the current castling rights
-        #generate all possible moves
-        moves = self.getAllPossibleMoves()
+        #find pins and checks once for this position instead of making every move and regenerating the opponents moves
+        inCheck, pins, checks = self.checkForPinsAndChecks()
         if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+            kingRow, kingCol = self.whiteKingLocation
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        #make each move
-        for i in range(len(moves)-1, -1, -1): # removing elemnts going backwards through the list
-            self.makeMove(moves[i])
-        #generate opponents moves
-        #see if oppenents moves attack the king
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])  #if they do attack the king, invalid move
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+            kingRow, kingCol = self.blackKingLocation
+        #generate all possible moves
+        moves = self.getAllPossibleMoves()
+        if not inCheck: #can't castle out of check
+            self.getCastleMoves(kingRow, kingCol, moves)
+        moves = self.removeIllegalMoves(moves, pins, checks)
+        if self.underpromotions:
+            moves = addUnderpromotions(moves, self.board)
+
         if len(moves) == 0: #either checkmate or stalemate
-            if self.inCheck():
+            if inCheck:
                 self.checkMate = True
             else:
                 self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
 
-        self.isEnpassantMove = tempEnpassantPossible
-        self.currentCastlingRight = tempCastleRights
-    
         return moves
 
+    #only the legal captures and queen promotions, used by the quiescence search
+    #checkMate/staleMate are left alone since most of the moves aren't generated
+    def getValidCaptures(self):
+        inCheck, pins, checks = self.checkForPinsAndChecks()
+        return self.removeIllegalMoves(self.getAllPossibleCaptures(), pins, checks)
+
+    #staged move generation (MoveOrdering.MoveOrderer.stagedMoves), the stages together give the same moves as getValidMoves
+    #returns (inCheck, legality), legality is what the other stage functions need to throw out illegal moves, worked out once per node
+    def getLegality(self):
+        inCheck, pins, checks = self.checkForPinsAndChecks()
+        return inCheck, (inCheck, pins, checks)
+
+    #legal captures and queen promotions
+    def getLegalCaptures(self, legality):
+        inCheck, pins, checks = legality
+        return self.removeIllegalMoves(self.getAllPossibleCaptures(), pins, checks)
+
+    #every legal move getLegalCaptures leaves out, castling included
+    def getLegalQuietMoves(self, legality):
+        inCheck, pins, checks = legality
+        moves = self.getAllPossibleQuietMoves()
+        if not inCheck:
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            self.getCastleMoves(kingRow, kingCol, moves)
+        return self.removeIllegalMoves(moves, pins, checks)
+
+    #the Move with this moveID if it is legal here, otherwise None (a hash or killer move can come from another position)
+    #only the moves of the piece on the start square are generated
+    def getLegalMove(self, moveID, legality):
+        inCheck, pins, checks = legality
+        r, c = (moveID & 63) // 8, (moveID & 63) % 8
+        piece = self.board[r][c]
+        if piece[0] != ('w' if self.whiteToMove else 'b'):
+            return None
+        moves = []
+        self.moveFunctions[piece[1]](r, c, moves)
+        if piece[1] == 'K' and not inCheck:
+            self.getCastleMoves(r, c, moves)
+        if self.underpromotions:
+            moves = addUnderpromotions(moves, self.board)
+        legal = self.removeIllegalMoves([move for move in moves if move.moveID == moveID], pins, checks)
+        return legal[0] if legal else None
+
+    #keeps the pseudo legal moves that don't leave our king in check, using the pins and checks from checkForPinsAndChecks
+    def removeIllegalMoves(self, moves, pins, checks):
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            kingRow, kingCol = self.blackKingLocation
+        pinDirections = {} #(row, col) of a pinned piece -> direction of the pin
+        for pin in pins:
+            pinDirections[(pin[0], pin[1])] = (pin[2], pin[3])
+        validSquares = None #squares a non king piece can move to when in check (block the check or capture the checker)
+        if len(checks) == 1:
+            checkRow, checkCol, dRow, dCol = checks[0]
+            if self.board[checkRow][checkCol][1] == 'N': #a knight check can't be blocked
+                validSquares = {(checkRow, checkCol)}
+            else:
+                validSquares = set()
+                for i in range(1, 8):
+                    square = (kingRow + dRow * i, kingCol + dCol * i)
+                    validSquares.add(square)
+                    if square == (checkRow, checkCol): #stop once we get to the checking piece
+                        break
+
+        validMoves = []
+        for move in moves:
+            if move.pieceMoved[1] == 'K':
+                if not self.kingMoveIntoCheck(move.endRow, move.endCol):
+                    validMoves.append(move)
+            elif len(checks) > 1: #double check, only the king can move
+                continue
+            elif move.isEnpassantMove:
+                #en passant removes two pieces from the same rank, so check it the slow way
+                if self.isMoveLegal(move):
+                    validMoves.append(move)
+            else:
+                pinDirection = pinDirections.get((move.startRow, move.startCol))
+                if pinDirection is not None: #pinned pieces can only move along the pin
+                    dRow = move.endRow - move.startRow
+                    dCol = move.endCol - move.startCol
+                    if dRow * pinDirection[1] != dCol * pinDirection[0]:
+                        continue
+                if validSquares is not None and (move.endRow, move.endCol) not in validSquares:
+                    continue
+                validMoves.append(move)
+        return validMoves
+
+    #makes the move and sees if it leaves our own king in check (only used for rare moves like en passant)
+    def isMoveLegal(self, move):
+        self.makeMove(move)
+        self.whiteToMove = not self.whiteToMove
+        legal = not self.checkForPinsAndChecks()[0]
+        self.whiteToMove = not self.whiteToMove
+        self.undoMove()
+        return legal
+
+    #see if the king of the player to move would be attacked on the square r, c
+    def kingMoveIntoCheck(self, r, c):
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        king = self.board[kingRow][kingCol]
+        self.board[kingRow][kingCol] = '--' #lift the king so it doesn't block a slider attacking the square behind it
+        attacked = self.isSquareAttacked(r, c, enemyColor)
+        self.board[kingRow][kingCol] = king
+        return attacked
+
+    #looks outwards from the king to find pieces pinned to it and enemy pieces checking it
+    #returns (inCheck, pins, checks), pins and checks are lists of (row, col, dRow, dCol)
+    def checkForPinsAndChecks(self):
+        pins = [] #squares of allied pinned pieces and the direction they are pinned from
+        checks = [] #squares of enemy pieces giving check and the direction of the check
+        inCheck = False
+        if self.whiteToMove:
+            enemyColor = 'b'
+            allyColor = 'w'
+            startRow, startCol = self.whiteKingLocation
+        else:
+            enemyColor = 'w'
+            allyColor = 'b'
+            startRow, startCol = self.blackKingLocation
+        #check outwards from the king for pins and checks, keep track of pins
+        directions = slidingDirections['Q']
+        rays = slidingRays['Q'][startRow * 8 + startCol]
+        for j in range(8):
+            d = directions[j]
+            possiblePin = () #reset possible pins
+            i = 0
+            for endRow, endCol in rays[j]:
+                i += 1
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != 'K': #our own king is ignored so it can't block a ray when it is moved
+                    if possiblePin == (): #1st allied piece could be pinned
+                        possiblePin = (endRow, endCol, d[0], d[1])
+                    else: #2nd allied piece, so no pin or check possible in this direction
+                        break
+                elif endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    #1. orthogonally away from king and piece is a rook
+                    #2. diagonally away from king and piece is a bishop
+                    #3. 1 square away diagonally from king and piece is a pawn
+                    #4. any direction and piece is a queen
+                    #5. any direction 1 square away and piece is a king
+                    if (0 <= j <= 3 and pieceType == 'R') or \
+                            (4 <= j <= 7 and pieceType == 'B') or \
+                            (i == 1 and pieceType == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
+                            (pieceType == 'Q') or (i == 1 and pieceType == 'K'):
+                        if possiblePin == (): #no piece blocking, so check
+                            inCheck = True
+                            checks.append((endRow, endCol, d[0], d[1]))
+                            break
+                        else: #piece blocking so pin
+                            pins.append(possiblePin)
+                            break
+                    else: #enemy piece not applying check
+                        break
+        #check for knight checks
+        for endRow, endCol in knightTargets[startRow * 8 + startCol]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] == enemyColor and endPiece[1] == 'N': #enemy knight attacking the king
+                inCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
+        return inCheck, pins, checks
+
 #determine if current player is in check
     def inCheck(self):
         if self.whiteToMove:
@@ -166,12 +619,47 @@ class GameState():
 
 #determine if enemy can attack the square r, c
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove #switch to opponets turn to see their moves
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove #switch turns back
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c: #square is under attack
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        return self.isSquareAttacked(r, c, enemyColor)
+
+    #determine if any piece of attackerColor attacks the square r, c
+    #looks backwards from the square for each piece type instead of generating the attackers moves
+    def isSquareAttacked(self, r, c, attackerColor):
+        board = self.board
+        sq = r * 8 + c
+        #knights
+        knight = attackerColor + 'N'
+        for endRow, endCol in knightTargets[sq]:
+            if board[endRow][endCol] == knight:
+                return True
+        #pawns attack diagonally forward, so the attacking pawns stand where a pawn of the other color on the square would capture
+        pawn = attackerColor + 'p'
+        for endRow, endCol in pawnCaptures['b' if attackerColor == 'w' else 'w'][sq]:
+            if board[endRow][endCol] == pawn:
                 return True
+        #kings
+        king = attackerColor + 'K'
+        for endRow, endCol in kingTargets[sq]:
+            if board[endRow][endCol] == king:
+                return True
+        #sliding pieces, the first piece on each ray is the only one that can attack
+        rook = attackerColor + 'R'
+        bishop = attackerColor + 'B'
+        queen = attackerColor + 'Q'
+        for ray in slidingRays['R'][sq]:
+            for endRow, endCol in ray:
+                endPiece = board[endRow][endCol]
+                if endPiece != '--':
+                    if endPiece == rook or endPiece == queen:
+                        return True
+                    break
+        for ray in slidingRays['B'][sq]:
+            for endRow, endCol in ray:
+                endPiece = board[endRow][endCol]
+                if endPiece != '--':
+                    if endPiece == bishop or endPiece == queen:
+                        return True
+                    break
         return False
 
     def getAllPossibleMoves(self):
@@ -184,108 +672,138 @@ class GameState():
                     self.moveFunctions[piece](r, c, moves) #calls the appropriate move function based on piece types
         return moves                
 
+    #like getAllPossibleMoves but only captures (en passant included) and pawn moves to the last rank
+    def getAllPossibleCaptures(self):
+        moves = []
+        board = self.board
+        allyColor = "w" if self.whiteToMove else "b"
+        enemyColor = "b" if self.whiteToMove else "w"
+        pawnDirection = -1 if self.whiteToMove else 1
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColor:
+                    continue
+                pieceType = piece[1]
+                sq = r * 8 + c
+                if pieceType == 'p':
+                    endRow = r + pawnDirection
+                    if (endRow == 0 or endRow == 7) and board[endRow][c] == "--": #promotion push
+                        moves.append(Move((r, c), (endRow, c), board))
+                    for target in pawnCaptures[allyColor][sq]:
+                        if board[target[0]][target[1]][0] == enemyColor:
+                            moves.append(Move((r, c), target, board))
+                        elif target == self.isEnpassantMove:
+                            moves.append(Move((r, c), target, board, isEmpassantMove=True))
+                elif pieceType == 'N' or pieceType == 'K':
+                    for target in (knightTargets[sq] if pieceType == 'N' else kingTargets[sq]):
+                        if board[target[0]][target[1]][0] == enemyColor:
+                            moves.append(Move((r, c), target, board))
+                else:
+                    for ray in slidingRays[pieceType][sq]:
+                        for target in ray: #slide to the first piece, it's a capture if it's an enemy
+                            endPiece = board[target[0]][target[1]]
+                            if endPiece != "--":
+                                if endPiece[0] == enemyColor:
+                                    moves.append(Move((r, c), target, board))
+                                break
+        return moves
+
+    #the pseudo legal moves getAllPossibleCaptures leaves out: moves to empty squares other than queen promotions,
+    #plus rook, bishop and knight promotions when underpromotions is on (castling not included)
+    #moves come out in the same order as getAllPossibleMoves
+    def getAllPossibleQuietMoves(self):
+        moves = []
+        board = self.board
+        allyColor = "w" if self.whiteToMove else "b"
+        enemyColor = "b" if self.whiteToMove else "w"
+        pawnDirection = -1 if self.whiteToMove else 1
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColor:
+                    continue
+                pieceType = piece[1]
+                sq = r * 8 + c
+                if pieceType == 'p':
+                    endRow = r + pawnDirection
+                    if endRow != 0 and endRow != 7:
+                        for target in pawnPushes[allyColor][sq]: #one square, then two from the starting row
+                            if board[target[0]][target[1]] != "--":
+                                break
+                            moves.append(Move((r, c), target, board))
+                    elif self.underpromotions:
+                        if board[endRow][c] == "--":
+                            for promotionPiece in ('R', 'B', 'N'):
+                                moves.append(Move((r, c), (endRow, c), board, promotionPiece=promotionPiece))
+                        for target in pawnCaptures[allyColor][sq]:
+                            if board[target[0]][target[1]][0] == enemyColor:
+                                for promotionPiece in ('R', 'B', 'N'):
+                                    moves.append(Move((r, c), target, board, promotionPiece=promotionPiece))
+                elif pieceType == 'N' or pieceType == 'K':
+                    for target in (knightTargets[sq] if pieceType == 'N' else kingTargets[sq]):
+                        if board[target[0]][target[1]] == "--":
+                            moves.append(Move((r, c), target, board))
+                else:
+                    for ray in slidingRays[pieceType][sq]:
+                        for target in ray:
+                            if board[target[0]][target[1]] != "--":
+                                break
+                            moves.append(Move((r, c), target, board))
+        return moves
+
         #get all the pawn moves for the pawn located at row, col. and add these movesto the list
     def getPawnMoves(self, r, c, moves):
-        if self.whiteToMove: #white pawn moves
-            if self.board[r-1][c] == "--": #1 square pawn advance
-                moves.append(Move((r, c), (r-1, c), self.board))
-                if r == 6 and self.board[r-2][c] == "--": #2 square pawn advance
-                    moves.append(Move((r, c), (r-2, c), self.board))
-
-            if c-1 >= 0: 
-                if self.board[r-1][c-1][0] == 'b': #enemy piece to capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.isEnpassantMove: #enpassant capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board, isEmpassantMove=True))
-                
-            if c+1 <= 7:
-                if self.board[r-1][c+1][0] == 'b': #enemy piece to capture
-                      moves.append(Move((r, c), (r-1, c+1), self.board)) 
-                elif (r-1, c+1) == self.isEnpassantMove: #enpassant capture
-                    moves.append(Move((r, c), (r-1, c+1), self.board, isEmpassantMove=True)) 
-
-        else: #black pawn moves
-            if self.board[r + 1][c] == "--":
-                moves.append(Move((r, c), (r + 1, c), self.board))
-                if r == 1 and self.board[r + 2][c] == "--":
-                    moves.append(Move((r, c), (r + 2, c), self.board))
-
-                #black pawn captures
-            if c - 1 >= 0: # capture to the left
-                if self.board[r + 1][c - 1][0] == 'w':
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                elif (r+1, c-1) == self.isEnpassantMove: #enpassant capture
-                    moves.append(Move((r, c), (r+1, c-1), self.board, isEmpassantMove=True))
-            if c + 1 <= 7: #capture to the right
-                if self.board[r + 1][c + 1][0] == 'w':
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                elif (r+1, c+1) == self.isEnpassantMove: #enpassant capture
-                    moves.append(Move((r, c), (r+1, c+1), self.board, isEmpassantMove=True))
-                    
-        #get all the rook moves for the rook located at row, col. and add these movesto the list
-    def getRookMoves(self, r, c, moves):
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) #direction the rook can move (up, left, down, right)
+        board = self.board
+        allyColor = "w" if self.whiteToMove else "b"
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--": #empty space Valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor: #enemy piece Valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else: #friendly piece invalid
-                        break
-                else: #off board
+        sq = r * 8 + c
+        for target in pawnPushes[allyColor][sq]: #1 square advance, then 2 from the starting row if both are empty
+            if board[target[0]][target[1]] != "--":
+                break
+            moves.append(Move((r, c), target, board))
+        for target in pawnCaptures[allyColor][sq]: #captures to the left then the right
+            if board[target[0]][target[1]][0] == enemyColor: #enemy piece to capture
+                moves.append(Move((r, c), target, board))
+            elif target == self.isEnpassantMove: #enpassant capture
+                moves.append(Move((r, c), target, board, isEmpassantMove=True))
+
+    #rook, bishop and queen moves, walking each ray from the square until it hits a piece (an enemy one can be captured)
+    def getSlidingMoves(self, r, c, rays, moves):
+        board = self.board
+        allyColor = "w" if self.whiteToMove else "b"
+        for ray in rays:
+            for target in ray:
+                endPiece = board[target[0]][target[1]]
+                if endPiece == "--": #empty space valid
+                    moves.append(Move((r, c), target, board))
+                else:
+                    if endPiece[0] != allyColor: #enemy piece valid
+                        moves.append(Move((r, c), target, board))
                     break
 
+    def getRookMoves(self, r, c, moves):
+        self.getSlidingMoves(r, c, slidingRays['R'][r * 8 + c], moves)
+
     def getKnightMoves(self, r, c, moves):
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)) #possible knight moves
+        board = self.board
         allyColor = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: #not an ally piece (empty or enemy)
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+        for target in knightTargets[r * 8 + c]:
+            if board[target[0]][target[1]][0] != allyColor: #not an ally piece (empty or enemy)
+                moves.append(Move((r, c), target, board))
 
     def getBishopMoves(self, r, c, moves):
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1)) #bishop diagonal directions
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8): #can move a max of 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--": #empty space valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break
-                else:
-                    break
+        self.getSlidingMoves(r, c, slidingRays['B'][r * 8 + c], moves)
 
     def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+        self.getSlidingMoves(r, c, slidingRays['Q'][r * 8 + c], moves) #the rook's rays then the bishop's
 
     def getKingMoves(self, r, c, moves):
-        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        board = self.board
         allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + kingMoves[i][0]
-            endCol = c + kingMoves[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: #not an ally piece (empty or enemy piece)
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+        for target in kingTargets[r * 8 + c]:
+            if board[target[0]][target[1]][0] != allyColor: #not an ally piece (empty or enemy piece)
+                moves.append(Move((r, c), target, board))
 
 
     #generate all valid castle moves for th eking and add them to list of moves
@@ -316,6 +834,9 @@ class CastleRights():
         self.wqs = wqs
         self.bqs = bqs
 
+#one CastleRights for each mask, GameState only ever points at these so nothing has to be copied when moves are made and undone
+castleRightsByMask = [CastleRights(mask & 1 != 0, mask & 4 != 0, mask & 2 != 0, mask & 8 != 0) for mask in range(16)]
+
 
 class Move():
     # maps keys to values
@@ -325,24 +846,32 @@ class Move():
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
     #dictionaries thich turns the ranks into rows and the files into columns. THis is what will put a label on each row and column going from 1-8 and a-h.
-
-    def __init__(self, start_s, end_s, board, isEmpassantMove=False, isCastleMove=False):
-        self.startRow = start_s[0]
-        self.startCol = start_s[1]
-        self.endRow = end_s[0]
-        self.endCol = end_s[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
+    promotionCodes = {'Q': 0, 'R': 1, 'B': 2, 'N': 3}
+
+    #millions of moves are made during a search, __slots__ stops each one carrying its own __dict__
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion', 'promotionPiece', 'isEnpassantMove', 'isCastleMove', 'moveID')
+
+    def __init__(self, start_s, end_s, board, isEmpassantMove=False, isCastleMove=False, promotionPiece='Q'):
+        self.startRow = startRow = start_s[0]
+        self.startCol = startCol = start_s[1]
+        self.endRow = endRow = end_s[0]
+        self.endCol = endCol = end_s[1]
+        self.pieceMoved = pieceMoved = board[startRow][startCol]
+        self.pieceCaptured = board[endRow][endCol]
         #pawn promotion
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7) #pawn promotion for white pawn
+        self.isPawnPromotion = (pieceMoved == 'wp' and endRow == 0) or (pieceMoved == 'bp' and endRow == 7) #pawn promotion for white pawn
+        self.promotionPiece = promotionPiece if self.isPawnPromotion else None #piece type the pawn turns into
         #en passant 
         self.isEnpassantMove = isEmpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
+        if isEmpassantMove:
+            self.pieceCaptured = 'wp' if pieceMoved == 'bp' else 'bp'
         #castle move
         self.isCastleMove = isCastleMove
 
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        #packed into one int: bits 0-5 start square, bits 6-11 end square, bits 12-13 promotion piece
+        self.moveID = (startRow * 8 + startCol) | ((endRow * 8 + endCol) << 6)
+        if self.isPawnPromotion:
+            self.moveID |= self.promotionCodes[promotionPiece] << 12
 
     #overriding the equals method
     def __eq__(self, other):#compares one object to another object
@@ -350,8 +879,15 @@ class Move():
                 return self.moveID == other.moveID
         return False
 
+    #moves that are equal have to hash the same so they can be used in sets and as dictionary keys
+    def __hash__(self):
+        return self.moveID
+
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion and self.promotionPiece != 'Q': #only under promotions are written out, queen is the default
+            notation += self.promotionPiece.lower()
+        return notation
 
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
\ No newline at end of file
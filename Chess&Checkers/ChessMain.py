@@ -1,6 +1,6 @@
 import pygame as p
 import pygame
-import ChessEngine, SmartMoveFinder
+import ChessEngine, SmartMoveFinder, BitboardEngine, ParallelSearch, BackgroundSearch, OpeningBook, Tablebase, SearchStats, Profiler
 
 p.display.set_caption('Comp Sci Chess')
 width = height = 512
@@ -8,6 +8,16 @@ dimension = 8 #8x8 board
 s_size = height // dimension
 max_fps = 15
 images = {}
+useBitboards = False #True uses the bitboard GameState backend (BitboardEngine) instead of ChessEngine
+aiMaxDepth = 6 #the AI deepens until it reaches this depth or runs out of time
+aiTimeLimit = 2.0 #seconds the AI can think for each move
+aiWorkers = 1 #more than 1 splits the AI's root moves over that many processes (ParallelSearch)
+aiUseBook = True #the AI plays its first moves from the opening book (book.bin) when the position is in it
+aiUseTablebases = True #the AI plays endgames with few pieces perfectly using the tables in Chess&Checkers/tablebases
+aiPonder = True #the AI keeps thinking on the reply it expects while the human moves (single process search only)
+aiStatsLog = None #file name, the search stats of every AI move are appended to it as a JSON line
+showStats = False #draws the stats of the AI's last search over the board, toggle with 's'
+profileFile = "profile.folded" #'p' starts profiling the move generator and search, pressing it again writes the flame graph stacks here
 
 # 0 = Chess, 1 is checkers
 CheckersCheck = input("Do you want to play checkers or Chess (Y for chess, N for checkers): ")
@@ -18,12 +28,18 @@ def loadImages():
         images[piece] = p.transform.scale(p.image.load("Chess&Checkers/" + piece + ".png"), (s_size,s_size))
 
 if CheckersCheck == "Y":
+    #makes a new game using whichever board backend is selected
+    def newGameState():
+        if useBitboards:
+            return BitboardEngine.BitboardGameState()
+        return ChessEngine.GameState()
+
     def main():
         p.init()
         screen = p.display.set_mode((width,height))
         clock = p.time.Clock()
         screen.fill(p.Color("white"))
-        gs = ChessEngine.GameState()
+        gs = newGameState()
         validMoves = gs.getValidMoves()
         moveMade = False #flag variable for when a move is made
         animate = False #flag variable for aniamted moves
@@ -34,10 +50,19 @@ if CheckersCheck == "Y":
         gameOver = False
         playerOne = True #if human is playing white, then this will be true. if AI is playing, then false
         playerTwo = False #same as above but for black
+        aiBook = OpeningBook.openDefaultBook() if aiUseBook else None
+        aiTablebases = Tablebase.Tablebases() if aiUseTablebases else None
+        aiContext = SmartMoveFinder.SearchContext(maxDepth=aiMaxDepth, timeLimit=aiTimeLimit, book=aiBook, tablebases=aiTablebases)
+        aiParallelSearch = ParallelSearch.ParallelSearch(aiWorkers, aiMaxDepth, aiTimeLimit, book=aiBook,
+                                                         tablebaseDirectory=Tablebase.defaultDirectory if aiUseTablebases else None) if aiWorkers > 1 else None
+        aiSearch = BackgroundSearch.BackgroundSearch(aiParallelSearch if aiParallelSearch is not None else aiContext) #searches on a thread so the window keeps responding
+        aiStats = None #SearchStats of the AI's last move
+        statsOverlay = showStats
         while running:
                 humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
                 for e in p.event.get():
                     if e.type == p.QUIT:
+                        aiSearch.cancel()
                         running = False
                     #mouse handler
                     elif e.type == p.MOUSEBUTTONDOWN:
@@ -67,26 +92,53 @@ if CheckersCheck == "Y":
                     #key handlers
                     elif e.type == p.KEYDOWN:
                         if e.key == p.K_z: #undo the move if 'z' is pressed
+                            aiSearch.cancel() #the position being searched is gone
                             gs.undoMove()
                             moveMade = True
                             animate = False
                         if e.key == p.K_x: #reset game if r button is clicked
-                            gs = ChessEngine.GameState()
+                            aiSearch.cancel()
+                            gs = newGameState()
                             validMoves = gs.getValidMoves()
                             s_selected = ()
                             p_clicks = []
                             moveMade = False
                             animate = False
                             gameOver = False
+                        if e.key == p.K_s: #show or hide the search stats
+                            statsOverlay = not statsOverlay
+                        if e.key == p.K_p: #start or stop profiling
+                            if Profiler.profiler.enabled:
+                                Profiler.profiler.disable([gs] + aiSearch.gameStates())
+                                print(Profiler.profiler.report(25))
+                                Profiler.profiler.writeFolded(profileFile)
+                                print("profile written to", profileFile)
+                                Profiler.profiler.reset()
+                            else:
+                                print("profiling, press p again to stop")
+                                Profiler.profiler.enable([gs] + aiSearch.gameStates())
 
                 #AI move finder logic
                 if not gameOver and not humanTurn:
-                    AIMove = SmartMoveFinder.findBestMove(gs, validMoves)
-                    if AIMove is None:
-                        AIMove = SmartMoveFinder.findRandomMove(validMoves)
-                    gs.makeMove(AIMove)
-                    moveMade = True
-                    animate = True
+                    aiSearch.start(gs) #does nothing if this position is already being searched (or pondered)
+                    if aiSearch.isFinished():
+                        AIMove = aiSearch.getResult(validMoves)
+                        if AIMove is None:
+                            AIMove = SmartMoveFinder.findRandomMove(validMoves)
+                        gs.makeMove(AIMove)
+                        aiStats = (aiParallelSearch or aiContext).stats
+                        if aiStatsLog is not None:
+                            SearchStats.appendJsonLine(aiStatsLog, aiStats)
+                        if (aiParallelSearch or aiContext).bookMove:
+                            print(AIMove.getChessNotation(), 'book move')
+                        elif aiParallelSearch is not None:
+                            print(AIMove.getChessNotation(), 'depth', aiParallelSearch.completedDepth, 'nodes', aiParallelSearch.nodes, 'quiescence nodes', aiParallelSearch.qNodes, 'workers', aiParallelSearch.workers)
+                        else:
+                            print(AIMove.getChessNotation(), 'depth', aiContext.completedDepth, 'nodes', aiContext.nodes, 'quiescence nodes', aiContext.qNodes, 'pv', SmartMoveFinder.principalVariationString(aiContext), aiContext.transpositionTable.getStats(), aiContext.moveOrderer.getStats())
+                        if aiPonder and ((gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)): #only while a human is thinking
+                            aiSearch.ponder(gs)
+                        moveMade = True
+                        animate = True
                             
 
                 if moveMade:
@@ -96,7 +148,7 @@ if CheckersCheck == "Y":
                     moveMade = False
                     animate = False
 
-                drawGameState(screen, gs, validMoves, s_selected)
+                drawGameState(screen, gs, validMoves, s_selected, aiStats if statsOverlay else None)
 
                 if gs.checkMate:
                     gameOver = True
@@ -111,6 +163,8 @@ if CheckersCheck == "Y":
 
                 clock.tick(max_fps)
                 p.display.flip()
+        if aiParallelSearch is not None:
+            aiParallelSearch.close()
 
     #highlight the square selected and possible moves for selected pieces
     def highlightSquares(screen, gs, validMoves, s_selected):
@@ -130,10 +184,23 @@ if CheckersCheck == "Y":
 
 
 
-    def drawGameState(screen, gs, validMoves, s_selected):
+    def drawGameState(screen, gs, validMoves, s_selected, stats=None):
         drawBoard(screen) #draw squares on the board
         highlightSquares(screen, gs, validMoves, s_selected)
         drawPieces(screen, gs.board) #draw pieces on the board
+        if stats is not None:
+            drawStats(screen, stats)
+
+    #the AI's last search stats in a see through box in the top left corner
+    def drawStats(screen, stats):
+        font = p.font.SysFont("Courier", 14, True, False)
+        lines = [font.render(line, True, p.Color("white")) for line in stats.summaryLines()]
+        lineHeight = font.get_linesize()
+        box = p.Surface((min(width, max(line.get_width() for line in lines) + 8), lineHeight * len(lines) + 8), p.SRCALPHA)
+        box.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            box.blit(line, (4, 4 + i * lineHeight))
+        screen.blit(box, (0, 0))
 
 
     def drawBoard(screen):
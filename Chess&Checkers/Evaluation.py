@@ -0,0 +1,127 @@
+#evaluation terms: material plus piece-square tables for the middlegame and endgame
+#GameState keeps these totals up to date in makeMove/undoMove so scoring a position doesn't need to scan the board
+#material is in pawns (same as pieceScores always was), the piece-square tables are in hundredths of a pawn
+
+#assigns a point value to each piece
+pieceScores = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
+
+#how much each piece counts towards the game phase, 24 is a full board (middlegame), 0 is only kings and pawns (endgame)
+phaseWeights = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "p": 0}
+MAX_PHASE = 24
+
+#tables are from white's point of view, written the way the board is drawn (first row is rank 8)
+#black uses the same tables flipped top to bottom
+pawnTable = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+     5,   5,  10,  25,  25,  10,   5,   5,
+     0,   0,   0,  20,  20,   0,   0,   0,
+     5,  -5, -10,   0,   0, -10,  -5,   5,
+     5,  10,  10, -20, -20,  10,  10,   5,
+     0,   0,   0,   0,   0,   0,   0,   0]
+pawnEndgameTable = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+    80,  80,  80,  80,  80,  80,  80,  80,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    30,  30,  30,  30,  30,  30,  30,  30,
+    20,  20,  20,  20,  20,  20,  20,  20,
+    10,  10,  10,  10,  10,  10,  10,  10,
+     0,   0,   0,   0,   0,   0,   0,   0,
+     0,   0,   0,   0,   0,   0,   0,   0]
+knightTable = [
+   -50, -40, -30, -30, -30, -30, -40, -50,
+   -40, -20,   0,   0,   0,   0, -20, -40,
+   -30,   0,  10,  15,  15,  10,   0, -30,
+   -30,   5,  15,  20,  20,  15,   5, -30,
+   -30,   0,  15,  20,  20,  15,   0, -30,
+   -30,   5,  10,  15,  15,  10,   5, -30,
+   -40, -20,   0,   5,   5,   0, -20, -40,
+   -50, -40, -30, -30, -30, -30, -40, -50]
+bishopTable = [
+   -20, -10, -10, -10, -10, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,  10,  10,   5,   0, -10,
+   -10,   5,   5,  10,  10,   5,   5, -10,
+   -10,   0,  10,  10,  10,  10,   0, -10,
+   -10,  10,  10,  10,  10,  10,  10, -10,
+   -10,   5,   0,   0,   0,   0,   5, -10,
+   -20, -10, -10, -10, -10, -10, -10, -20]
+rookTable = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+     5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+     0,   0,   0,   5,   5,   0,   0,   0]
+queenTable = [
+   -20, -10, -10,  -5,  -5, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,   5,   5,   5,   0, -10,
+    -5,   0,   5,   5,   5,   5,   0,  -5,
+     0,   0,   5,   5,   5,   5,   0,  -5,
+   -10,   5,   5,   5,   5,   5,   0, -10,
+   -10,   0,   5,   0,   0,   0,   0, -10,
+   -20, -10, -10,  -5,  -5, -10, -10, -20]
+kingTable = [
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -20, -30, -30, -40, -40, -30, -30, -20,
+   -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,   0,   0,   0,   0,  20,  20,
+    20,  30,  10,   0,   0,  10,  30,  20]
+kingEndgameTable = [
+   -50, -40, -30, -20, -20, -30, -40, -50,
+   -30, -20, -10,   0,   0, -10, -20, -30,
+   -30, -10,  20,  30,  30,  20, -10, -30,
+   -30, -10,  30,  40,  40,  30, -10, -30,
+   -30, -10,  30,  40,  40,  30, -10, -30,
+   -30, -10,  20,  30,  30,  20, -10, -30,
+   -30, -30,   0,   0,   0,   0, -30, -30,
+   -50, -30, -30, -30, -30, -30, -30, -50]
+
+middlegameTables = {"p": pawnTable, "N": knightTable, "B": bishopTable, "R": rookTable, "Q": queenTable, "K": kingTable}
+endgameTables = {"p": pawnEndgameTable, "N": knightTable, "B": bishopTable, "R": rookTable, "Q": queenTable, "K": kingEndgameTable}
+
+#lookups used by makeMove/undoMove, signed so white pieces add and black pieces subtract
+#materialValues[piece], phaseValues[piece], middlegameValues[piece][r*8 + c], endgameValues[piece][r*8 + c]
+materialValues = {}
+phaseValues = {}
+middlegameValues = {}
+endgameValues = {}
+for color, sign in (('w', 1), ('b', -1)):
+    for pieceType in pieceScores:
+        piece = color + pieceType
+        materialValues[piece] = sign * pieceScores[pieceType]
+        phaseValues[piece] = phaseWeights[pieceType]
+        middlegameValues[piece] = [0] * 64
+        endgameValues[piece] = [0] * 64
+        for r in range(8):
+            for c in range(8):
+                tableRow = r if color == 'w' else 7 - r
+                middlegameValues[piece][r * 8 + c] = sign * middlegameTables[pieceType][tableRow * 8 + c]
+                endgameValues[piece][r * 8 + c] = sign * endgameTables[pieceType][tableRow * 8 + c]
+
+
+#all four evaluation totals for a board from scratch: (material, middlegame table total, endgame table total, phase)
+def evaluationTerms(board):
+    material = middlegame = endgame = phase = 0
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece != "--":
+                material += materialValues[piece]
+                middlegame += middlegameValues[piece][r * 8 + c]
+                endgame += endgameValues[piece][r * 8 + c]
+                phase += phaseValues[piece]
+    return material, middlegame, endgame, phase
+
+#combines the totals into one score in pawns, positive is good for white
+#the piece-square part blends from the middlegame to the endgame table as pieces come off
+def combineTerms(material, middlegame, endgame, phase):
+    phase = min(phase, MAX_PHASE)
+    return material + (middlegame * phase + endgame * (MAX_PHASE - phase)) / (MAX_PHASE * 100)
@@ -0,0 +1,117 @@
+#orders moves before the alpha beta search loop so the best moves are searched first and cutoffs come early
+#order: hash (transposition table) move, captures by MVV-LVA, promotions, killer moves, then quiet moves by history score
+#stagedMoves gives the same order but only generates each group of moves once the search gets to it
+
+#piece values used for ordering only (most valuable victim - least valuable attacker)
+mvvLvaValues = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 10}
+
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+PROMOTION_SCORE = 90000
+KILLER_SCORE = 80000 #first killer, the second killer is one less
+HISTORY_LIMIT = 70000 #history scores are halved once one gets this big so quiet moves stay below the killers
+MAX_PLY = 64
+
+
+class MoveOrderer():
+    def __init__(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)] #moveIDs of two quiet moves per ply that caused a beta cutoff
+        self.history = {} #(piece moved, end row, end col) -> how often that quiet move caused a cutoff, weighted by depth
+        self.resetStats()
+
+    def resetStats(self):
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0 #cutoffs caused by the first move searched, close to cutoffs when the ordering is good
+        self.movesGenerated = 0 #moves generated for the main search (not the quiescence search)
+        self.generatedNodes = 0 #nodes those moves were generated for
+
+    #call at the start of every search, killers are from a different position so throw them away and age the history
+    def newSearch(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        for k in self.history:
+            self.history[k] //= 2
+        self.resetStats()
+
+    #hashMove is a moveID (or None)
+    def scoreMove(self, move, ply, hashMove):
+        if move.moveID == hashMove:
+            return HASH_MOVE_SCORE
+        if move.pieceCaptured != "--":
+            return CAPTURE_SCORE + mvvLvaValues[move.pieceCaptured[1]] * 10 - mvvLvaValues[move.pieceMoved[1]]
+        if move.isPawnPromotion:
+            return PROMOTION_SCORE
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move.moveID == killers[0]:
+                return KILLER_SCORE
+            if move.moveID == killers[1]:
+                return KILLER_SCORE - 1
+        return self.history.get((move.pieceMoved, move.endRow, move.endCol), 0)
+
+    #returns a new list with the moves in search order (moves with the same score keep generator order)
+    def orderMoves(self, moves, ply, hashMove=None):
+        return sorted(moves, key=lambda move: self.scoreMove(move, ply, hashMove), reverse=True)
+
+    #for the generation stats when a node's moves were all generated up front
+    def countGenerated(self, count):
+        self.movesGenerated += count
+        self.generatedNodes += 1
+
+    #yields the legal moves of gs in search order, one stage at a time: the hash move, captures and queen promotions,
+    #the killer moves, then the other quiet moves, a stage is only generated once the ones before it have all been searched
+    #so a cutoff skips the rest of the generation (gs has to be back in the same position each time the next move is asked for)
+    def stagedMoves(self, gs, ply, hashMove=None):
+        inCheck, legality = gs.getLegality()
+        self.generatedNodes += 1
+        searched = set()
+        if hashMove is not None:
+            move = gs.getLegalMove(hashMove, legality)
+            if move is not None:
+                self.movesGenerated += 1
+                searched.add(hashMove)
+                yield move
+
+        captures = gs.getLegalCaptures(legality)
+        self.movesGenerated += len(captures)
+        for move in self.orderMoves(captures, ply):
+            if move.moveID != hashMove:
+                yield move
+
+        if ply < MAX_PLY:
+            for killer in tuple(self.killers[ply]): #copied, searching a killer can change the list
+                if killer is None or killer in searched:
+                    continue
+                move = gs.getLegalMove(killer, legality)
+                if move is not None and move.pieceCaptured == "--" and not move.isPawnPromotion: #the same move here can be a capture
+                    self.movesGenerated += 1
+                    searched.add(killer)
+                    yield move
+
+        quiets = gs.getLegalQuietMoves(legality)
+        self.movesGenerated += len(quiets)
+        for move in self.orderMoves(quiets, ply):
+            if move.moveID not in searched:
+                yield move
+
+    #called by the search when move caused a beta cutoff, index is where the move was in the ordered list
+    def recordCutoff(self, move, ply, depth, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.firstMoveCutoffs += 1
+        if move.pieceCaptured != "--" or move.isPawnPromotion: #killers and history are for quiet moves only
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move.moveID != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move.moveID
+        key = (move.pieceMoved, move.endRow, move.endCol)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+        if self.history[key] > HISTORY_LIMIT:
+            for k in self.history:
+                self.history[k] //= 2
+
+    def getStats(self):
+        return {'cutoffs': self.cutoffs, 'firstMoveCutoffs': self.firstMoveCutoffs,
+                'firstMoveCutoffRate': self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0,
+                'movesGenerated': self.movesGenerated, 'movesPerNode': self.movesGenerated / self.generatedNodes if self.generatedNodes else 0.0}
@@ -0,0 +1,167 @@
+#opening book, moves looked up by the position's zobrist key so the AI can play the opening instantly and with some variety
+#book file format (little endian):
+#   header: 4 byte magic "CCBK", 4 byte version, 4 byte number of entries
+#   entries: 8 byte zobrist key, 2 byte moveID, 2 byte weight (how often the move was played), sorted by key then moveID
+#the file is memory mapped and searched with a binary search, so opening a book costs the same whatever its size
+#build a book from game records with: python OpeningBook.py build openings.txt -o book.bin
+#look a position up with:             python OpeningBook.py probe --fen "<fen>"
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import ChessEngine
+
+MAGIC = b"CCBK"
+VERSION = 1
+header = struct.Struct("<4sII")
+entry = struct.Struct("<QHH")
+MAX_WEIGHT = 0xFFFF
+MAX_PLY = 20 #moves of each game that go into the book
+defaultBookPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+gameResults = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: #empty file
+            self.file.close()
+            raise ValueError("opening book " + path + " is empty")
+        magic, version, self.count = header.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or len(self.data) != header.size + self.count * entry.size:
+            self.close()
+            raise ValueError("opening book " + path + " is not a version %d book file" % VERSION)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    #(key, moveID, weight) of entry number i
+    def getEntry(self, i):
+        return entry.unpack_from(self.data, header.size + i * entry.size)
+
+    #index of the first entry with this key (or where it would go)
+    def findFirst(self, key):
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.getEntry(mid)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    #list of (moveID, weight) for the position with this key
+    def getMoves(self, key):
+        moves = []
+        i = self.findFirst(key)
+        while i < self.count:
+            entryKey, moveID, weight = self.getEntry(i)
+            if entryKey != key:
+                break
+            moves.append((moveID, weight))
+            i += 1
+        return moves
+
+    #picks one of the book moves for gs out of validMoves, more often played moves are picked more often
+    #returns None when the position isn't in the book
+    def pickMove(self, gs, validMoves, rng=random):
+        movesByID = {move.moveID: move for move in validMoves}
+        candidates = [(movesByID[moveID], weight) for moveID, weight in self.getMoves(gs.zobristKey) if moveID in movesByID] #a key collision can't give an illegal move
+        if not candidates:
+            return None
+        pick = rng.randint(1, sum(weight for move, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+
+#opens the book next to this file, None if there isn't one
+def openDefaultBook():
+    if not os.path.exists(defaultBookPath):
+        return None
+    return OpeningBook(defaultBookPath)
+
+
+#reads game records (one game per line, moves written like Move.getChessNotation, move numbers and results are skipped,
+#anything after a # is a comment) and counts how often each move was played in each position
+#returns (counts, number of games), counts maps (zobrist key, moveID) to a count
+def readGames(paths, maxPly=MAX_PLY):
+    counts = {}
+    games = 0
+    for path in paths:
+        with open(path) as f:
+            for lineNumber, line in enumerate(f, 1):
+                tokens = [token for token in line.split("#")[0].split() if not token.endswith(".") and token not in gameResults]
+                if not tokens:
+                    continue
+                games += 1
+                gs = ChessEngine.GameState()
+                gs.underpromotions = True
+                for token in tokens[:maxPly]:
+                    move = None
+                    for validMove in gs.getValidMoves():
+                        if validMove.getChessNotation() == token:
+                            move = validMove
+                    if move is None:
+                        print("%s:%d: '%s' is not a legal move, skipping the rest of the game" % (path, lineNumber, token))
+                        break
+                    key = (gs.zobristKey, move.moveID)
+                    counts[key] = counts.get(key, 0) + 1
+                    gs.makeMove(move)
+    return counts, games
+
+def writeBook(counts, path):
+    entries = sorted(counts.items())
+    with open(path, "wb") as f:
+        f.write(header.pack(MAGIC, VERSION, len(entries)))
+        for (key, moveID), count in entries:
+            f.write(entry.pack(key, moveID, min(count, MAX_WEIGHT)))
+    return len(entries)
+
+def buildBook(gamePaths, bookPath, maxPly=MAX_PLY, minCount=1):
+    counts, games = readGames(gamePaths, maxPly)
+    counts = {key: count for key, count in counts.items() if count >= minCount}
+    entries = writeBook(counts, bookPath)
+    return {"games": games, "positions": len(set(key for key, moveID in counts)), "entries": entries}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or look up the opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book file from game records")
+    build.add_argument("games", nargs="+", help="text files with one game per line")
+    build.add_argument("-o", "--output", default=defaultBookPath)
+    build.add_argument("--max-ply", type=int, default=MAX_PLY, help="moves of each game to use")
+    build.add_argument("--min-count", type=int, default=1, help="leave out moves played fewer times than this")
+    probe = commands.add_parser("probe", help="list the book moves for a position")
+    probe.add_argument("--fen", help="position to look up (default is the starting position)")
+    probe.add_argument("--book", default=defaultBookPath)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        stats = buildBook(args.games, args.output, args.max_ply, args.min_count)
+        print("%d games, %d positions, %d moves written to %s" % (stats["games"], stats["positions"], stats["entries"], args.output))
+        return 0
+
+    book = OpeningBook(args.book)
+    gs = ChessEngine.GameState()
+    gs.underpromotions = True
+    if args.fen:
+        gs.loadFen(args.fen)
+    for move in gs.getValidMoves():
+        for moveID, weight in book.getMoves(gs.zobristKey):
+            if moveID == move.moveID:
+                print(move.getChessNotation(), weight)
+    book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
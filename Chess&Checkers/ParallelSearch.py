@@ -0,0 +1,252 @@
+#multi-core search by splitting the root moves over a process pool
+#each worker process rebuilds the position from a FEN snapshot (GameStates don't pickle cheaply) and searches one root move,
+#keeping its own transposition table and move orderer between tasks so later iterations reuse earlier work
+#the first (best so far) root move is searched on its own first, the rest are then searched in parallel with its score as alpha
+#so they can be cut off as early as the single core search would (young brothers wait)
+#setting stopRequested from another thread ends the search within STOP_POLL_SECONDS, the last completed iteration is kept,
+#and the workers are told through a shared value to drop the root moves they are still searching
+#run the scaling benchmark with: python ParallelSearch.py --depth 4 --workers 1,2,4,8
+#note: with the spawn start method (Windows, macOS) the pool re-imports the main module, so use it from a script guarded by
+#if __name__ == "__main__"
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+import MoveOrdering
+import Perft
+import Tablebase
+import SearchStats
+
+CHECKMATE = SmartMoveFinder.CHECKMATE
+STOP_POLL_SECONDS = 0.05 #how often a search waiting on a worker checks stopRequested
+
+#state kept by each worker process between tasks
+workerContext = None
+workerSearchID = None
+workerGameState = None
+workerStopFlag = None #shared with the ParallelSearch, holds the ID of the last search it stopped
+
+
+#pool initializer, a multiprocessing.Value can only reach the workers when they are started, not with each task
+def initWorker(stopFlag):
+    global workerStopFlag
+    workerStopFlag = stopFlag
+
+
+#makes a game state for a position snapshot: (fen, bitboards, underpromotions)
+def gameStateFromSnapshot(position):
+    fen, bitboards, underpromotions = position
+    gs = BitboardEngine.BitboardGameState() if bitboards else ChessEngine.GameState()
+    gs.loadFen(fen)
+    gs.underpromotions = underpromotions
+    return gs
+
+def positionSnapshot(gs):
+    fen = gs.getFen()
+    return (fen, isinstance(gs, BitboardEngine.BitboardGameState), gs.underpromotions)
+
+#runs in a worker process, searches one root move depth plies deep (the move itself is the first ply)
+#limits is (searchID, deadline from time.time() or None, transposition table size, useQuiescence, tablebase directory or None)
+#returns (moveID, score for the side to move at the root, stopped, nodes, quiescence nodes)
+def searchRootMove(position, moveID, depth, alpha, beta, limits):
+    global workerContext, workerSearchID, workerGameState
+    searchID, deadline, ttSizeMB, useQuiescence, tablebaseDirectory = limits
+    if workerStopFlag.value == searchID: #queued before the search was stopped
+        return moveID, 0, True, 0, 0
+    if workerContext is None or workerContext.transpositionTable.sizeMB != ttSizeMB:
+        workerContext = SmartMoveFinder.SearchContext(ttSizeMB=ttSizeMB)
+    context = workerContext
+    if tablebaseDirectory is None:
+        context.tablebases = None
+    elif context.tablebases is None or context.tablebases.directory != tablebaseDirectory: #each worker maps the tables itself
+        context.tablebases = Tablebase.Tablebases(tablebaseDirectory)
+    if searchID != workerSearchID: #new root position, age the table and throw away the killers
+        context.newSearch()
+        workerSearchID = searchID
+        workerGameState = gameStateFromSnapshot(position)
+    gs = workerGameState
+    context.useQuiescence = useQuiescence
+    context.nodes = 0
+    context.qNodes = 0
+    context.stopped = False
+    context.startTime = time.perf_counter()
+    context.timeLimit = None if deadline is None else max(0.0, deadline - time.time())
+    context.rootDepth = depth
+    context.stopFlag = workerStopFlag
+    context.stopSearchID = searchID
+
+    move = None
+    for validMove in gs.getValidMoves():
+        if validMove.moveID == moveID:
+            move = validMove
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    gs.makeMove(move)
+    score = -SmartMoveFinder.searchChild(gs, depth - 1, -beta, -alpha, -turnMultiplier, context, 1)
+    gs.undoMove()
+    return moveID, score, context.stopped, context.nodes, context.qNodes
+
+
+#keeps the process pool alive between moves, starting the workers takes longer than a shallow search
+#has the same results as a SearchContext (bestMove, bestScore, completedDepth, nodes, qNodes) plus depthTimes,
+#the seconds from the start of the search until each depth finished
+class ParallelSearch():
+    def __init__(self, workers=None, maxDepth=SmartMoveFinder.DEPTH, timeLimit=None, ttSizeMB=SmartMoveFinder.TT_SIZE_MB, useQuiescence=True, book=None, tablebaseDirectory=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.maxDepth = maxDepth
+        self.timeLimit = timeLimit
+        self.ttSizeMB = ttSizeMB #per worker
+        self.useQuiescence = useQuiescence
+        self.book = book #OpeningBook checked before searching
+        self.tablebaseDirectory = tablebaseDirectory #the workers use the tablebases in this directory
+        self.stopFlag = multiprocessing.Value('i', 0) #set to the searchID to stop the workers searching for it
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker, initargs=(self.stopFlag,))
+        self.stopRequested = False #set from another thread to stop the search
+        self.searchID = 0
+        self.newSearch()
+
+    def newSearch(self):
+        self.searchID += 1
+        self.nodes = 0
+        self.qNodes = 0
+        self.startTime = time.perf_counter()
+        self.bestMove = None
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.bookMove = False
+        self.depthTimes = []
+        self.stats = SearchStats.SearchStats() #node counts and times only, the other counters stay in the workers
+
+    def elapsed(self):
+        return time.perf_counter() - self.startTime
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    #iterative deepening like SmartMoveFinder.findBestMove, each iteration splits the root moves over the workers
+    def findBestMove(self, gs, validMoves):
+        self.newSearch()
+        if len(validMoves) == 0:
+            return None
+        if self.book is not None:
+            self.bestMove = self.book.pickMove(gs, validMoves)
+            if self.bestMove is not None:
+                self.bookMove = True
+                self.stats.finish(self)
+                return self.bestMove
+        position = positionSnapshot(gs)
+        deadline = time.time() + self.timeLimit if self.timeLimit is not None else None
+        limits = (self.searchID, deadline, self.ttSizeMB, self.useQuiescence, self.tablebaseDirectory)
+        movesByID = {move.moveID: move for move in validMoves}
+        order = [move.moveID for move in MoveOrdering.MoveOrderer().orderMoves(validMoves, 0)] #captures first until there are scores
+
+        for depth in range(1, self.maxDepth + 1):
+            scores = {}
+            self.stats.startIteration(self)
+            first = self.waitForResult(self.executor.submit(searchRootMove, position, order[0], depth, -CHECKMATE, CHECKMATE, limits))
+            stopped = first is None or self.addResult(first, scores)
+            if not stopped:
+                alpha = first[1]
+                futures = [self.executor.submit(searchRootMove, position, moveID, depth, alpha, CHECKMATE, limits) for moveID in order[1:]]
+                for future in futures:
+                    result = self.waitForResult(future)
+                    if result is None or self.addResult(result, scores):
+                        stopped = True
+            self.stats.endIteration(self, depth, not (stopped or self.stopRequested))
+            if stopped or self.stopRequested: #unfinished iteration, keep the last completed result
+                break
+            #moves that failed low only have an upper bound, but that is still fine for ordering the next iteration
+            order.sort(key=lambda moveID: scores[moveID], reverse=True) #stable, so the first move wins ties
+            self.bestMove = movesByID[order[0]]
+            self.bestScore = scores[order[0]]
+            self.completedDepth = depth
+            self.depthTimes.append((depth, self.elapsed()))
+            if self.timeLimit is not None and self.elapsed() * 2 > self.timeLimit:
+                break
+        self.stats.finish(self)
+        return self.bestMove
+
+    #waits for a worker's result while checking stopRequested, returns None if the search was stopped first
+    #(a root move a worker has already started can't be cancelled, the stop flag makes it give up at its next limits check)
+    def waitForResult(self, future):
+        while not self.stopRequested:
+            done, notDone = wait([future], timeout=STOP_POLL_SECONDS)
+            if done:
+                return future.result()
+        self.stopFlag.value = self.searchID
+        future.cancel()
+        return None
+
+    #adds one worker result to the scores and node counts, returns True if that search ran out of time
+    def addResult(self, result, scores):
+        moveID, score, stopped, nodes, qNodes = result
+        self.nodes += nodes
+        self.qNodes += qNodes
+        if not stopped:
+            scores[moveID] = score
+        return stopped
+
+
+#time to reach depth with 1 core (SmartMoveFinder) and then the parallel search with each worker count
+#returns a list of result dictionaries, one per worker count (0 is the single core search)
+def benchmark(fens, depth, workerCounts):
+    results = []
+    for workers in [0] + list(workerCounts):
+        seconds = 0
+        nodes = 0
+        if workers == 0:
+            context = SmartMoveFinder.SearchContext(maxDepth=depth)
+            for fen in fens:
+                gs = ChessEngine.GameState()
+                gs.loadFen(fen)
+                startTime = time.perf_counter()
+                SmartMoveFinder.findBestMove(gs, gs.getValidMoves(), context)
+                seconds += time.perf_counter() - startTime
+                nodes += context.nodes + context.qNodes
+        else:
+            search = ParallelSearch(workers=workers, maxDepth=depth)
+            search.findBestMove(ChessEngine.GameState(), ChessEngine.GameState().getValidMoves()) #start the worker processes
+            for fen in fens:
+                gs = ChessEngine.GameState()
+                gs.loadFen(fen)
+                startTime = time.perf_counter()
+                search.findBestMove(gs, gs.getValidMoves())
+                seconds += time.perf_counter() - startTime
+                nodes += search.nodes + search.qNodes
+            search.close()
+        results.append({"workers": workers, "depth": depth, "seconds": round(seconds, 4), "nodes": nodes,
+                        "nps": int(nodes / seconds) if seconds > 0 else 0})
+    baseline = results[0]["seconds"]
+    for result in results:
+        result["speedup"] = round(baseline / result["seconds"], 2) if result["seconds"] > 0 else 0.0
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to depth of the parallel root search")
+    parser.add_argument("--fen", help="position to search instead of the perft reference positions")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated worker counts")
+    parser.add_argument("--json", help="write the results to this file as JSON")
+    args = parser.parse_args(argv)
+
+    fens = [args.fen] if args.fen else [fen for name, fen, counts in Perft.referencePositions]
+    workerCounts = [int(count) for count in args.workers.split(",")]
+    print("%d position(s) to depth %d, %d cpus" % (len(fens), args.depth, os.cpu_count() or 1))
+    results = benchmark(fens, args.depth, workerCounts)
+    for result in results:
+        name = "single core" if result["workers"] == 0 else "%d workers" % result["workers"]
+        print("%-12s %8.2fs  %9d nodes  %8d nodes/s  %5.2fx" % (name, result["seconds"], result["nodes"], result["nps"], result["speedup"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
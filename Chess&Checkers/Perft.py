@@ -0,0 +1,268 @@
+#perft (performance test) for the move generator
+#counts every leaf of the game tree to a fixed depth and compares it with the known counts for standard positions
+#any bug in castling, en passant, promotion or check detection shows up as a wrong count
+#run with: python Perft.py            (all reference positions)
+#          python Perft.py --fen "<fen>" --depth 3 --divide
+#          python Perft.py --json perft.json --bitboards
+#          python Perft.py --profile perft.folded      (per function timings and flame graph stacks, see Profiler.py)
+#          python Perft.py --checks [--bitboards]       (regression checks for bugs perft counts alone don't show)
+#          python Perft.py --compare                    (speed of the mailbox and bitboard backends side by side)
+
+import argparse
+import json
+import random
+import sys
+import time
+import ChessEngine
+import BitboardEngine
+import Profiler
+import SmartMoveFinder
+
+#(name, fen, known node counts for depth 1, 2, 3...)
+#counts are from the chess programming wiki perft results page and include under promotions
+referencePositions = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("enpassant endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("promotions mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", [6, 264, 9467, 422333]),
+    ("promotion capture", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594]),
+]
+#depth each reference position is run to by default, picked so the whole suite takes a few seconds
+defaultDepths = {"start": 4, "kiwipete": 3, "enpassant endgame": 4, "promotions": 3, "promotions mirrored": 3, "promotion capture": 3, "middlegame": 3}
+
+
+#makes a game state for the fen with under promotions turned on (perft counts every promotion piece)
+def newGameState(fen, bitboards=False):
+    gs = BitboardEngine.BitboardGameState() if bitboards else ChessEngine.GameState()
+    gs.loadFen(fen)
+    gs.underpromotions = True
+    return gs
+
+#number of leaf nodes depth moves from the current position
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth <= 1: #bulk count, no need to make the last moves
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+#perft split by root move, used to find which move a wrong count comes from
+#returns a list of (notation, nodes)
+def divide(gs, depth):
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move.getChessNotation(), perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+
+#runs perft on one position and returns a result dictionary
+def runPosition(name, fen, depth, expected=None, bitboards=False):
+    gs = newGameState(fen, bitboards)
+    startKey = gs.zobristKey
+    startTime = time.perf_counter()
+    nodes = perft(gs, depth)
+    seconds = time.perf_counter() - startTime
+    result = {"name": name, "fen": fen, "depth": depth, "nodes": nodes, "seconds": round(seconds, 4),
+              "nps": int(nodes / seconds) if seconds > 0 else 0,
+              "backend": "bitboard" if bitboards else "mailbox"}
+    if expected is not None:
+        result["expected"] = expected
+        result["passed"] = nodes == expected
+    if gs.zobristKey != startKey or len(gs.moveLog) != 0: #make/undo must leave the position exactly as it was
+        result["passed"] = False
+        result["error"] = "position not restored after search"
+    return result
+
+def runSuite(depth=None, bitboards=False):
+    results = []
+    for name, fen, counts in referencePositions:
+        d = depth if depth is not None else defaultDepths[name]
+        d = min(d, len(counts))
+        results.append(runPosition(name, fen, d, counts[d - 1], bitboards))
+    return results
+
+#regression checks, each takes the backend flag and returns a list of problems (empty when it passes)
+
+#random games where every legal move is made and undone before picking one (like the search probing moves), at every ply
+#the moves and castle rights must match a second game state that plays the same moves without probing
+#a shared castle rights object changed by a probed king or rook move used to lose or bring back castling this way
+def checkCastleRightsAfterProbing(bitboards=False, games=12, plies=60, seed=1):
+    problems = []
+    rng = random.Random(seed)
+    starts = ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1",
+              "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"]
+    for game in range(games):
+        gs = newGameState(starts[game % len(starts)], bitboards)
+        reference = newGameState(starts[game % len(starts)], bitboards)
+        for ply in range(plies):
+            validMoves = gs.getValidMoves()
+            if len(validMoves) == 0:
+                break
+            for move in validMoves:
+                gs.makeMove(move)
+                gs.getValidMoves()
+                gs.undoMove()
+            validMoves = gs.getValidMoves()
+            referenceMoves = reference.getValidMoves()
+            if sorted(move.moveID for move in validMoves) != sorted(move.moveID for move in referenceMoves) or \
+                    ChessEngine.castleRightsMask(gs.currentCastlingRight) != ChessEngine.castleRightsMask(reference.currentCastlingRight):
+                problems.append("game %d ply %d: %s" % (game, ply, reference.getFen()))
+                break
+            move = rng.choice(validMoves)
+            gs.makeMove(move)
+            reference.makeMove([referenceMove for referenceMove in referenceMoves if referenceMove.moveID == move.moveID][0])
+    return problems
+
+#searches with null move pruning and late move reductions on and plays out the principal variation, every move must be legal
+#the positions have null move cutoffs and reduced moves that get searched again, the check fails if none happened
+#a table row left over from a null move or a quiescence leaf used to end up in the line
+def checkPrincipalVariationIsLegal(bitboards=False, depth=5):
+    problems = []
+    fens = [fen for name, fen, counts in referencePositions] + \
+           ["6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "2r3k1/5ppp/8/8/8/8/5PPP/1Q4K1 w - - 0 1", "kr6/ppq5/8/8/8/8/5PPP/3Q1RK1 w - - 0 1"]
+    context = SmartMoveFinder.SearchContext(maxDepth=depth, useNullMove=True, useLateMoveReductions=True)
+    nullMoveCutoffs = 0
+    reSearches = 0
+    for fen in fens:
+        gs = newGameState(fen, bitboards)
+        SmartMoveFinder.findBestMove(gs, gs.getValidMoves(), context)
+        nullMoveCutoffs += context.nullMoveCutoffs
+        reSearches += context.reSearches
+        for move in context.principalVariation:
+            if move.moveID not in [validMove.moveID for validMove in gs.getValidMoves()]:
+                problems.append("%s: %s is illegal in the line %s" % (fen, move.getChessNotation(), SmartMoveFinder.principalVariationString(context)))
+                break
+            gs.makeMove(move)
+    if nullMoveCutoffs == 0 or reSearches == 0:
+        problems.append("no null move cutoffs (%d) or late move re-searches (%d) to check" % (nullMoveCutoffs, reSearches))
+    return problems
+
+#FENs without exactly one king a side or with a pawn on the first or last rank must be refused by loadFen
+#(a missing king used to be analysed as stalemate, a back rank pawn crashed the bitboard move generator)
+def checkBadFensAreRefused(bitboards=False):
+    problems = []
+    for fen in ["8/8/8/8/8/8/8/8 w - - 0 1", "8/8/8/4k3/8/8/8/8 w - - 0 1", "4k3/8/8/8/8/8/8/8 b - - 0 1",
+                "4k3/8/8/8/8/8/8/3KK3 w - - 0 1", "3kk3/8/8/8/8/8/8/4K3 b - - 0 1",
+                "P7/8/8/8/8/8/k7/4K3 w - - 0 1", "4k3/8/8/8/8/8/8/p3K3 b - - 0 1", "4k2p/8/8/8/8/8/8/4K3 w - - 0 1"]:
+        gs = BitboardEngine.BitboardGameState() if bitboards else ChessEngine.GameState()
+        try:
+            gs.loadFen(fen)
+            problems.append("accepted " + fen)
+        except ValueError:
+            pass
+    return problems
+
+regressionChecks = [("castle rights survive make/undo probing", checkCastleRightsAfterProbing),
+                    ("principal variation is legal with pruning on", checkPrincipalVariationIsLegal),
+                    ("bad FENs are refused", checkBadFensAreRefused)]
+
+#runs every regression check, returns True if they all pass
+def runChecks(bitboards=False):
+    passed = True
+    for name, check in regressionChecks:
+        try:
+            problems = check(bitboards)
+        except Exception as e: #a broken search or move generator often crashes instead of giving a wrong answer
+            problems = ["%s: %s" % (type(e).__name__, e)]
+        print("%-50s %s" % (name, "ok" if not problems else "FAIL (%d)" % len(problems)))
+        for problem in problems[:5]:
+            print("    " + problem)
+        passed = passed and not problems
+    return passed
+
+#runs the suite on both backends, repeats times each keeping the fastest run of every position (the others are noise)
+#returns (mailbox results, bitboard results)
+def compareBackends(depth=None, repeats=3):
+    backends = []
+    for bitboards in (False, True):
+        best = None
+        for i in range(repeats):
+            results = runSuite(depth, bitboards)
+            best = results if best is None else [min(a, b, key=lambda result: result["seconds"]) for a, b in zip(best, results)]
+        backends.append(best)
+    return backends[0], backends[1]
+
+def printComparison(mailbox, bitboard):
+    print("%-20s %5s %10s %12s %12s %8s" % ("position", "depth", "nodes", "mailbox n/s", "bitboard n/s", "bb/mb"))
+    for a, b in zip(mailbox, bitboard):
+        print("%-20s %5d %10d %12d %12d %7.2fx" % (a["name"], a["depth"], a["nodes"], a["nps"], b["nps"], b["nps"] / a["nps"] if a["nps"] else 0.0))
+    mailboxSeconds = sum(result["seconds"] for result in mailbox)
+    bitboardSeconds = sum(result["seconds"] for result in bitboard)
+    nodes = sum(result["nodes"] for result in mailbox)
+    print("%-20s %5s %10d %12d %12d %7.2fx" % ("total", "", nodes, nodes / mailboxSeconds, nodes / bitboardSeconds, mailboxSeconds / bitboardSeconds))
+
+def printResult(result):
+    status = ""
+    if "passed" in result:
+        status = "ok" if result["passed"] else "FAIL (expected %d)" % result["expected"]
+    print("%-20s depth %d  %10d nodes  %7.2fs  %8d nodes/s  %s" % (result["name"], result["depth"], result["nodes"], result["seconds"], result["nps"], status))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generator test and benchmark")
+    parser.add_argument("--fen", help="position to test instead of the reference suite")
+    parser.add_argument("--depth", type=int, help="search depth (default depends on the position)")
+    parser.add_argument("--divide", action="store_true", help="print the node count for each root move")
+    parser.add_argument("--bitboards", action="store_true", help="use the bitboard GameState backend")
+    parser.add_argument("--json", help="write the results to this file as JSON")
+    parser.add_argument("--profile", help="profile the move generator and write the folded stacks to this file (slows it down)")
+    parser.add_argument("--checks", action="store_true", help="run the regression checks instead of perft")
+    parser.add_argument("--compare", action="store_true", help="time the reference suite on both backends (best of 3 runs each)")
+    args = parser.parse_args(argv)
+
+    if args.checks:
+        return 0 if runChecks(args.bitboards) else 1
+
+    if args.compare:
+        mailbox, bitboard = compareBackends(args.depth)
+        printComparison(mailbox, bitboard)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"mailbox": mailbox, "bitboard": bitboard}, f, indent=2)
+        return 0 if all(result["passed"] for result in mailbox + bitboard) else 1
+
+    if args.profile:
+        Profiler.profiler.enable()
+
+    print("move tables built in %.2fms at import" % (ChessEngine.moveTableSeconds * 1000))
+    if args.fen:
+        depth = args.depth or 3
+        if args.divide:
+            gs = newGameState(args.fen, args.bitboards)
+            total = 0
+            for notation, nodes in divide(gs, depth):
+                print(notation, nodes)
+                total += nodes
+            print("total", total)
+        results = [runPosition("fen", args.fen, depth, bitboards=args.bitboards)]
+    else:
+        results = runSuite(args.depth, args.bitboards)
+
+    totalNodes = 0
+    totalSeconds = 0
+    for result in results:
+        printResult(result)
+        totalNodes += result["nodes"]
+        totalSeconds += result["seconds"]
+    summary = {"nodes": totalNodes, "seconds": round(totalSeconds, 4), "nps": int(totalNodes / totalSeconds) if totalSeconds > 0 else 0,
+               "passed": all(result.get("passed", True) for result in results), "moveTableSeconds": round(ChessEngine.moveTableSeconds, 6)}
+    print("total %d nodes in %.2fs, %d nodes/s" % (summary["nodes"], summary["seconds"], summary["nps"]))
+    if args.profile:
+        Profiler.profiler.disable()
+        print(Profiler.profiler.report(25))
+        Profiler.profiler.writeFolded(args.profile)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "summary": summary}, f, indent=2)
+    return 0 if summary["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#profiling mode for the move generator and search hot path: call counts, total time and self time per function, and the
+#time spent under every call stack in the folded format flame graph tools read (flamegraph.pl, speedscope, inferno)
+#enable() swaps the listed functions for timing wrappers and disable() puts the originals back, so nothing is timed
+#(or slowed down) while it is off
+#game states made while profiling get the wrapped move functions, older ones need bindMoveFunctions() (enable and disable
+#take the game states to rebind)
+#the search's worker processes (ParallelSearch, Analyse, Tournament) aren't profiled, only the process profiling is enabled in
+#profile a search with: python Profiler.py --depth 4 -o search.folded
+#profile perft with: python Profiler.py --perft --depth 3 --bitboards -o perft.folded
+#or add --profile file to Perft.py, or press 'p' in ChessMain (once to start, again to write profile.folded and print the table)
+
+import argparse
+import sys
+import threading
+import time
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+import MoveOrdering
+import TranspositionTable
+
+#(object, name shown in the results, attributes to wrap)
+hotPath = [
+    (ChessEngine.GameState, "GameState", ["makeMove", "undoMove", "getValidMoves", "getAllPossibleMoves", "getAllPossibleCaptures",
+                                          "getAllPossibleQuietMoves", "getLegalMove", "getPawnMoves", "getRookMoves", "getKnightMoves",
+                                          "getBishopMoves", "getQueenMoves", "getKingMoves", "getCastleMoves", "checkForPinsAndChecks",
+                                          "removeIllegalMoves", "inCheck", "squareUnderAttack", "isSquareAttacked"]),
+    (ChessEngine.Move, "Move", ["__init__"]),
+    (BitboardEngine.BitboardGameState, "BitboardGameState", ["makeMove", "undoMove", "getValidMoves", "getLegalMoves",
+                                                             "getPawnMoves", "getLegalMove", "getLegality", "getPins", "attackersTo",
+                                                             "inCheck", "squareUnderAttack"]),
+    (SmartMoveFinder, "SmartMoveFinder", ["findMoveNegaMaxAlphaBeta", "quiescenceSearch", "scoreBoard", "staticEvaluation"]),
+    (MoveOrdering.MoveOrderer, "MoveOrderer", ["orderMoves", "recordCutoff"]),
+    (TranspositionTable.TranspositionTable, "TranspositionTable", ["probe", "store"]),
+]
+
+
+class Profiler():
+    def __init__(self, targets=hotPath):
+        self.targets = targets
+        self.enabled = False
+        self.originals = [] #(object, attribute, original) for everything wrapped
+        self.local = threading.local() #call stacks are per thread, ChessMain searches on a thread of its own
+        self.calls = {} #name -> calls
+        self.totalTime = {} #name -> seconds inside the outermost calls (a recursive function isn't counted twice)
+        self.selfTime = {} #name -> seconds not spent in other wrapped functions
+        self.folded = {} #call stack tuple -> self seconds
+        self.seconds = 0.0 #time profiled for
+        self.startTime = None
+
+    #throws away the results so far, the wrappers keep adding to the same dictionaries
+    def reset(self):
+        self.calls.clear()
+        self.totalTime.clear()
+        self.selfTime.clear()
+        self.folded.clear()
+        self.seconds = 0.0
+        self.startTime = time.perf_counter() if self.enabled else None
+
+    def enable(self, gameStates=()):
+        if self.enabled:
+            return
+        for owner, prefix, attributes in self.targets:
+            for attribute in attributes:
+                original = vars(owner).get(attribute)
+                if original is None:
+                    continue
+                self.originals.append((owner, attribute, original))
+                setattr(owner, attribute, self.wrap(prefix + "." + attribute, original))
+        self.enabled = True
+        self.startTime = time.perf_counter()
+        for gs in gameStates:
+            rebind(gs)
+
+    def disable(self, gameStates=()):
+        if not self.enabled:
+            return
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+        self.enabled = False
+        self.seconds += time.perf_counter() - self.startTime
+        for gs in gameStates:
+            rebind(gs)
+
+    #the timing wrapper for one function
+    def wrap(self, name, function):
+        clock = time.perf_counter
+        calls, totalTime, selfTime, folded, local = self.calls, self.totalTime, self.selfTime, self.folded, self.local
+
+        def wrapper(*args, **kwargs):
+            stack = getattr(local, "stack", None)
+            if stack is None:
+                stack = local.stack = []
+                local.childTimes = []
+            childTimes = local.childTimes
+            outermost = name not in stack
+            stack.append(name)
+            childTimes.append(0.0)
+            startTime = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - startTime
+                ownTime = elapsed - childTimes.pop()
+                key = tuple(stack)
+                stack.pop()
+                if childTimes:
+                    childTimes[-1] += elapsed
+                calls[name] = calls.get(name, 0) + 1
+                selfTime[name] = selfTime.get(name, 0.0) + ownTime
+                if outermost:
+                    totalTime[name] = totalTime.get(name, 0.0) + elapsed
+                folded[key] = folded.get(key, 0.0) + ownTime
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    #one dictionary a function, most total time first
+    def results(self):
+        rows = []
+        for name, calls in self.calls.items():
+            rows.append({"name": name, "calls": calls, "totalSeconds": self.totalTime.get(name, 0.0), "selfSeconds": self.selfTime[name],
+                         "microsecondsPerCall": self.totalTime.get(name, 0.0) / calls * 1e6})
+        rows.sort(key=lambda row: row["totalSeconds"], reverse=True)
+        return rows
+
+    def report(self, limit=None):
+        seconds = self.seconds + (time.perf_counter() - self.startTime if self.enabled else 0.0)
+        lines = ["%.2fs profiled (timing adds its own overhead, compare the functions with each other)" % seconds,
+                 "%-44s %10s %10s %10s %10s" % ("function", "calls", "total s", "self s", "us/call")]
+        for row in self.results()[:limit]:
+            lines.append("%-44s %10d %10.3f %10.3f %10.2f" % (row["name"], row["calls"], row["totalSeconds"], row["selfSeconds"], row["microsecondsPerCall"]))
+        return "\n".join(lines)
+
+    #folded stacks, "outer;inner;innermost microseconds" a line
+    def writeFolded(self, path):
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.folded.items()):
+                microseconds = int(seconds * 1e6)
+                if microseconds > 0:
+                    f.write(";".join(stack) + " " + str(microseconds) + "\n")
+
+
+#makes a game state pick up the current (wrapped or original) move functions
+def rebind(gs):
+    if hasattr(gs, "bindMoveFunctions"):
+        gs.bindMoveFunctions()
+
+#the profiler used by ChessMain and Perft
+profiler = Profiler()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the move generator and search")
+    parser.add_argument("--fen", help="position to profile instead of the perft reference positions")
+    parser.add_argument("--depth", type=int, default=3, help="search or perft depth")
+    parser.add_argument("--perft", action="store_true", help="profile perft instead of a search")
+    parser.add_argument("--bitboards", action="store_true", help="use the bitboard GameState backend")
+    parser.add_argument("-o", "--output", default="profile.folded", help="file for the folded stacks")
+    parser.add_argument("--top", type=int, default=25, help="functions shown in the table")
+    args = parser.parse_args(argv)
+
+    import Perft #not at the top, Perft imports this module for its --profile option
+    fens = [args.fen] if args.fen else [fen for name, fen, counts in Perft.referencePositions]
+    profiler.enable()
+    try:
+        for fen in fens:
+            gs = Perft.newGameState(fen, args.bitboards)
+            if args.perft:
+                Perft.perft(gs, args.depth)
+            else:
+                SmartMoveFinder.findBestMove(gs, gs.getValidMoves(), SmartMoveFinder.SearchContext(maxDepth=args.depth))
+    finally:
+        profiler.disable()
+    print(profiler.report(args.top))
+    profiler.writeFolded(args.output)
+    print("folded stacks written to", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
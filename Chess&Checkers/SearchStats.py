@@ -0,0 +1,118 @@
+#statistics for one search: totals, nodes per second, effective branching factor and a breakdown per iteration of
+#iterative deepening (nodes, time, beta cutoffs, first move cutoff rate, transposition table hit rate)
+#SmartMoveFinder.findBestMove leaves one in context.stats and ParallelSearch.findBestMove in search.stats, the parallel search
+#only knows the node counts and times (the cutoff and table counters are in the worker processes)
+#write them out with stats.toJson() (one JSON line a search) or appendJsonLine(path, stats) to grow a log file
+
+import json
+
+
+class SearchStats():
+    def __init__(self):
+        self.move = None #best move in chess notation, None when there was no move
+        self.bookMove = False
+        self.score = 0
+        self.depth = 0 #last completed iteration
+        self.nodes = 0
+        self.qNodes = 0
+        self.seconds = 0.0
+        self.iterations = [] #one dictionary a started iteration, the last one can be unfinished (completed is False)
+        self.transpositionTable = None #TranspositionTable.getStats() when the search has a table
+        self.moveOrdering = None #MoveOrderer.getStats()
+        self.pruning = None #counts of the pruning and re-search decisions
+        self.pv = []
+        self.iterationStart = None
+
+    #call before searching an iteration, search is a SmartMoveFinder.SearchContext or a ParallelSearch.ParallelSearch
+    def startIteration(self, search):
+        self.iterationStart = counters(search)
+
+    #call once the iteration has finished (completed) or been stopped
+    def endIteration(self, search, depth, completed=True):
+        before = self.iterationStart
+        after = counters(search)
+        seconds, nodes, qNodes, cutoffs, firstMoveCutoffs, ttProbes, ttHits = \
+            [None if b is None else a - b for a, b in zip(after, before)]
+        searched = nodes + qNodes
+        previous = self.iterations[-1]["nodes"] + self.iterations[-1]["qNodes"] if self.iterations else 0
+        iteration = {"depth": depth, "completed": completed, "seconds": round(seconds, 6), "nodes": nodes, "qNodes": qNodes,
+                     "nps": int(searched / seconds) if seconds > 0 else 0,
+                     "branchingFactor": round(searched / previous, 3) if previous else None, #nodes compared to the iteration before
+                     "cutoffs": cutoffs, "firstMoveCutoffs": firstMoveCutoffs,
+                     "firstMoveCutoffRate": round(firstMoveCutoffs / cutoffs, 4) if cutoffs else None,
+                     "ttProbes": ttProbes, "ttHits": ttHits, "ttHitRate": round(ttHits / ttProbes, 4) if ttProbes else None}
+        self.iterations.append(iteration)
+
+    #fills in the totals once the search is over
+    def finish(self, search):
+        self.move = search.bestMove.getChessNotation() if search.bestMove is not None else None
+        self.bookMove = search.bookMove
+        self.score = search.bestScore
+        self.depth = search.completedDepth
+        self.nodes = search.nodes
+        self.qNodes = search.qNodes
+        self.seconds = search.elapsed()
+        transpositionTable = getattr(search, "transpositionTable", None)
+        if transpositionTable is not None:
+            self.transpositionTable = transpositionTable.getStats()
+        moveOrderer = getattr(search, "moveOrderer", None)
+        if moveOrderer is not None:
+            self.moveOrdering = moveOrderer.getStats()
+        if hasattr(search, "nullMoveCutoffs"):
+            self.pruning = {"nullMoveCutoffs": search.nullMoveCutoffs, "reductions": search.reductions, "reSearches": search.reSearches,
+                            "pvsReSearches": search.pvsReSearches, "aspirationFails": search.aspirationFails, "tbHits": search.tbHits}
+        self.pv = [move.getChessNotation() for move in getattr(search, "principalVariation", [])]
+
+    def nps(self):
+        return int((self.nodes + self.qNodes) / self.seconds) if self.seconds > 0 else 0
+
+    #N = b^d for the last completed iteration, the branching factor of a uniform tree of the same size and depth
+    def branchingFactor(self):
+        for iteration in reversed(self.iterations):
+            if iteration["completed"] and iteration["depth"] > 0:
+                return (iteration["nodes"] + iteration["qNodes"]) ** (1 / iteration["depth"])
+        return 0.0
+
+    def toDict(self):
+        return {"move": self.move, "bookMove": self.bookMove, "score": self.score, "depth": self.depth, "nodes": self.nodes,
+                "qNodes": self.qNodes, "seconds": round(self.seconds, 6), "nps": self.nps(), "branchingFactor": round(self.branchingFactor(), 3),
+                "pv": self.pv, "iterations": self.iterations, "transpositionTable": self.transpositionTable,
+                "moveOrdering": self.moveOrdering, "pruning": self.pruning}
+
+    def toJson(self):
+        return json.dumps(self.toDict())
+
+    #short lines for the on screen overlay
+    def summaryLines(self):
+        if self.bookMove:
+            return ["book move " + str(self.move)]
+        lines = ["depth %d  %.2fs  score %.2f" % (self.depth, self.seconds, self.score),
+                 "nodes %d (+%d q)" % (self.nodes, self.qNodes),
+                 "%d nodes/s  EBF %.2f" % (self.nps(), self.branchingFactor())]
+        if self.moveOrdering is not None:
+            lines.append("first move cutoffs %.0f%%" % (self.moveOrdering["firstMoveCutoffRate"] * 100))
+        if self.transpositionTable is not None:
+            lines.append("TT hits %.0f%%" % (self.transpositionTable["hitRate"] * 100))
+        for iteration in self.iterations:
+            lines.append("d%d %8d nodes %6.3fs%s" % (iteration["depth"], iteration["nodes"] + iteration["qNodes"], iteration["seconds"],
+                                                     "" if iteration["completed"] else " (stopped)"))
+        if self.pv:
+            lines.append("pv " + " ".join(self.pv))
+        return lines
+
+
+#(seconds, nodes, quiescence nodes, cutoffs, first move cutoffs, table probes, table hits) so far in the search,
+#None for the counters the search doesn't have
+def counters(search):
+    moveOrderer = getattr(search, "moveOrderer", None)
+    transpositionTable = getattr(search, "transpositionTable", None)
+    return (search.elapsed(), search.nodes, search.qNodes,
+            moveOrderer.cutoffs if moveOrderer is not None else None,
+            moveOrderer.firstMoveCutoffs if moveOrderer is not None else None,
+            transpositionTable.probes if transpositionTable is not None else None,
+            transpositionTable.hits if transpositionTable is not None else None)
+
+#adds the stats to a JSON lines file (one search a line)
+def appendJsonLine(path, stats):
+    with open(path, "a") as f:
+        f.write(stats.toJson() + "\n")
@@ -1,10 +1,115 @@
 import random
+import time
+import TranspositionTable
+import MoveOrdering
+import Evaluation
+import BatchEval
+import SearchStats
 
 #assigns a point value to each piece
-pieceScores = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
+pieceScores = Evaluation.pieceScores
 CHECKMATE = 1000
 STALEMATE = 0
-DEPTH = 3
+DEPTH = 3 #default maximum depth for findBestMove
+TT_SIZE_MB = 32
+CHECK_LIMITS_EVERY = 256 #nodes between time/node budget checks
+DELTA_MARGIN = 2 #a capture has to be able to bring the score within this many pawns of alpha or the quiescence search skips it
+QUIESCENCE_MAX_PLY = 10 #captures deeper than this past the horizon aren't searched
+NULL_WINDOW = 0.0001 #smaller than the smallest difference between two evaluations (1/2400 of a pawn), for zero window searches
+NULL_MOVE_REDUCTION = 2 #the null move is searched this many plies less deep than a real move
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3 #late move reductions only at nodes with at least this much depth left
+LMR_MIN_MOVES = 3 #moves searched at full depth before later quiet moves get reduced
+ASPIRATION_WINDOW = 0.5 #pawns either side of the last iteration's score, doubled on the side that fails
+ASPIRATION_MIN_DEPTH = 3 #shallower iterations are cheap enough to search with the full window
+MAX_PLY = 64 #rows of the principal variation table, deeper than any search here gets
+
+
+#everything one search needs, so several searches can run in the same process without sharing globals
+#the transposition table and move orderer are kept between searches so work from the AI's last turn can be reused
+#timeLimit is in seconds and nodeLimit counts nodes (main search and quiescence together), None means no limit
+#useQuiescence=False scores the horizon with the static evaluation like the search used to
+#book is an OpeningBook.OpeningBook that findBestMove checks before searching, None plays without a book
+#tablebases is a Tablebase.Tablebases, positions in it get their exact score without being searched
+#evaluation is a function scoring a position for white (like materialEvaluation), None uses staticEvaluation
+#batchEvaluation=True scores all the leaves below a depth 1 node together with BatchEval (needs NumPy, is only used
+#without the quiescence search and with the normal evaluation)
+#useStagedMoves=True lets nodes below the root generate their moves in stages (MoveOrderer.stagedMoves) so a cutoff skips
+#generating the rest, False generates every move of a node before searching any of them
+#useNullMove: if passing the turn still scores at least beta in a shallower search the node is cut off without searching moves
+#(not in check, and not when the side to move has only pawns left, where passing is often better than any move)
+#useLateMoveReductions: quiet moves late in the move order are searched a ply less deep first, and again at full depth
+#only if they beat alpha
+#usePVS: after the first move of a node the others only have to be proven worse with a zero window search, they are searched
+#again with the full window if they turn out better (principal variation search)
+#useAspirationWindows: each iteration starts with a narrow window around the last iteration's score instead of the full one
+class SearchContext():
+    def __init__(self, maxDepth=DEPTH, timeLimit=None, nodeLimit=None, ttSizeMB=TT_SIZE_MB, useQuiescence=True, book=None, tablebases=None, evaluation=None, batchEvaluation=False,
+                 useStagedMoves=True, useNullMove=True, useLateMoveReductions=True, usePVS=True, useAspirationWindows=True):
+        if batchEvaluation:
+            BatchEval.checkAvailable()
+        self.maxDepth = maxDepth
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.useQuiescence = useQuiescence
+        self.book = book
+        self.tablebases = tablebases
+        self.evaluation = evaluation
+        self.batchEvaluation = batchEvaluation
+        self.useStagedMoves = useStagedMoves
+        self.useNullMove = useNullMove
+        self.useLateMoveReductions = useLateMoveReductions
+        self.usePVS = usePVS
+        self.useAspirationWindows = useAspirationWindows
+        #triangular principal variation table, row ply holds the best line found from that ply (pvLength[ply] moves long)
+        self.pvTable = [[None] * (MAX_PLY - ply) for ply in range(MAX_PLY)]
+        self.pvLength = [0] * (MAX_PLY + 1)
+        self.transpositionTable = TranspositionTable.TranspositionTable(ttSizeMB)
+        self.moveOrderer = MoveOrdering.MoveOrderer()
+        self.stopRequested = False #set from another thread to stop the search early
+        #in a ParallelSearch worker, a multiprocessing.Value the main process sets to stopSearchID to stop the search early
+        self.stopFlag = None
+        self.stopSearchID = None
+        self.newSearch()
+
+    def newSearch(self):
+        self.transpositionTable.newSearch()
+        self.transpositionTable.resetStats() #counters are per search, the entries are kept
+        self.moveOrderer.newSearch()
+        self.nodes = 0 #main search nodes
+        self.qNodes = 0 #quiescence search nodes
+        self.tbHits = 0 #positions scored by the tablebases
+        self.nullMoveCutoffs = 0
+        self.reductions = 0 #moves searched with a late move reduction
+        self.reSearches = 0 #reduced moves that beat alpha and were searched again at full depth
+        self.pvsReSearches = 0 #zero window searches that beat alpha and were searched again with the full window
+        self.aspirationFails = 0 #iterations searched again because the score fell outside the aspiration window
+        self.principalVariation = [] #moves expected from the root of the last completed iteration, bestMove first
+        self.pvKeys = [] #zobrist keys of the positions the principal variation moves are played from
+        self.stats = SearchStats.SearchStats() #filled in by findBestMove
+        self.stopped = False
+        self.startTime = time.perf_counter()
+        self.rootDepth = 0
+        self.rootBestMove = None #best move so far in the iteration being searched
+        self.bestMove = None #best move of the last completed iteration
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.bookMove = False #True when bestMove came from the opening book
+
+    def elapsed(self):
+        return time.perf_counter() - self.startTime
+
+    #sets stopped once the time or node budget runs out, the first iteration is always allowed to finish
+    def checkLimits(self):
+        if self.rootDepth <= 1:
+            return
+        if self.stopRequested or (self.stopFlag is not None and self.stopFlag.value == self.stopSearchID) or \
+                (self.nodeLimit is not None and self.nodes + self.qNodes >= self.nodeLimit) or \
+                (self.timeLimit is not None and self.elapsed() >= self.timeLimit):
+            self.stopped = True
+
+#used by findBestMove when no context is passed in
+defaultContext = SearchContext()
 
 #picks and returns a random move
 def findRandomMove(validMoves):
@@ -44,12 +149,75 @@ def findBestMoveMinMaxNoRecursion(gs, validMoves):
     return bestPlayerMove
     
 
-#helper method to make first recursive call
-def findBestMove(gs, validMoves):
-    global nextMove 
-    nextMove = None
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    return nextMove
+#iterative deepening driver, searches depth 1, 2, 3... until maxDepth or the budget runs out
+#returns the best move from the last iteration that finished
+def findBestMove(gs, validMoves, context=None):
+    if context is None:
+        context = defaultContext
+    context.newSearch()
+    if context.book is not None:
+        context.bestMove = context.book.pickMove(gs, validMoves)
+        if context.bestMove is not None:
+            context.bookMove = True
+            context.stats.finish(context)
+            return context.bestMove
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    for depth in range(1, context.maxDepth + 1):
+        context.rootDepth = depth
+        context.stats.startIteration(context)
+        score = aspirationSearch(gs, validMoves, depth, turnMultiplier, context)
+        context.stats.endIteration(context, depth, not context.stopped)
+        if context.stopped: #unfinished iteration, keep the last completed result
+            break
+        context.bestMove = context.rootBestMove
+        context.bestScore = score
+        context.completedDepth = depth
+        setPrincipalVariation(gs, context)
+        #the next iteration takes several times longer than this one, don't start it if it can't finish
+        if context.timeLimit is not None and context.elapsed() * 2 > context.timeLimit:
+            break
+    context.stats.finish(context)
+    return context.bestMove
+
+#searches the root depth plies deep, starting with a window around the last iteration's score and widening the side that
+#fails until the score is inside it, mate scores and shallow iterations use the full window straight away
+def aspirationSearch(gs, validMoves, depth, turnMultiplier, context):
+    alpha, beta = -CHECKMATE, CHECKMATE
+    delta = ASPIRATION_WINDOW
+    if context.useAspirationWindows and depth >= ASPIRATION_MIN_DEPTH and abs(context.bestScore) < CHECKMATE / 2:
+        alpha, beta = context.bestScore - delta, context.bestScore + delta
+    while True:
+        context.rootBestMove = None
+        score = findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier, context, 0)
+        if context.stopped:
+            return 0
+        if score <= alpha and alpha > -CHECKMATE:
+            alpha = max(score - delta, -CHECKMATE)
+        elif score >= beta and beta < CHECKMATE:
+            beta = min(score + delta, CHECKMATE)
+        else:
+            return score
+        context.aspirationFails += 1
+        delta *= 2
+
+#copies the root row of the principal variation table into context.principalVariation, along with the key of the position
+#before each move so the next iteration can search the line first
+def setPrincipalVariation(gs, context):
+    context.principalVariation = context.pvTable[0][:context.pvLength[0]]
+    if context.bestMove is None:
+        context.principalVariation = []
+    elif not context.principalVariation or context.principalVariation[0] is not context.bestMove:
+        context.principalVariation = [context.bestMove]
+    context.pvKeys = []
+    for move in context.principalVariation:
+        context.pvKeys.append(gs.zobristKey)
+        gs.makeMove(move)
+    for move in context.principalVariation:
+        gs.undoMove()
+
+#the moves of the principal variation in chess notation, separated by spaces
+def principalVariationString(context):
+    return " ".join(move.getChessNotation() for move in context.principalVariation)
 
 def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
     global nextMove
@@ -68,26 +236,198 @@ def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
         gs.undoMove()
     return maxScore
 
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
+#validMoves can be None, then the moves are generated in stages as they are searched
+#ply is the number of real moves from the root (a null move doesn't count), it indexes the killers, the principal variation
+#and the principal variation table
+#allowNullMove is False right after a null move, two passes in a row would prove nothing
+#a line of moves that raises alpha is copied into the principal variation table, lines cut short by a transposition table
+#hit, the tablebases or the horizon just end there (the child's row is emptied before each move so nothing older is copied)
+def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier, context, ply, allowNullMove=True):
+    context.nodes += 1
+    if context.nodes % CHECK_LIMITS_EVERY == 0:
+        context.checkLimits()
+    context.pvLength[ply] = 0
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
-    
-    #move ordering - implementing later
+        return turnMultiplier * scoreBoard(gs, context.evaluation)
+    if validMoves is not None and len(validMoves) == 0: #no moves, checkmate or stalemate
+        return -CHECKMATE if gs.checkMate else STALEMATE
+    if context.tablebases is not None and ply != 0:
+        score = tablebaseScore(gs, context)
+        if score is not None:
+            return score
+
+    #use a stored result if this position was already searched at least this deep
+    #(not at the root, the root always has to search so rootBestMove gets set)
+    transpositionTable = context.transpositionTable
+    moveOrderer = context.moveOrderer
+    alphaOriginal = alpha
+    entry = transpositionTable.probe(gs.zobristKey)
+    hashMove = entry[4] if entry is not None else None
+    if ply < len(context.pvKeys) and context.pvKeys[ply] == gs.zobristKey: #still on the last iteration's line, search it first
+        hashMove = context.principalVariation[ply].moveID
+    if entry is not None and ply != 0 and entry[1] >= depth:
+        entryScore, bound = entry[2], entry[3]
+        if bound == TranspositionTable.EXACT or \
+                (bound == TranspositionTable.LOWERBOUND and entryScore >= beta) or \
+                (bound == TranspositionTable.UPPERBOUND and entryScore <= alpha):
+            transpositionTable.cutoffs += 1
+            return entryScore
+
+    inCheck = None #only worked out when a pruning decision needs it
+    if context.useNullMove and allowNullMove and depth >= NULL_MOVE_MIN_DEPTH and ply != 0 and beta < CHECKMATE / 2:
+        inCheck = gs.inCheck()
+        if not inCheck and turnMultiplier * (staticEvaluation(gs) if context.evaluation is None else context.evaluation(gs)) >= beta and hasPieces(gs):
+            gs.makeNullMove()
+            score = -searchChild(gs, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + NULL_WINDOW, -turnMultiplier, context, ply, False)
+            gs.undoNullMove()
+            context.pvLength[ply] = 0 #the null move's search was on this ply too, its line isn't this node's
+            if context.stopped:
+                return 0
+            if score >= beta: #even passing is good enough, a real move will be too (mate scores aren't proven by a pass)
+                context.nullMoveCutoffs += 1
+                transpositionTable.store(gs.zobristKey, depth, beta, TranspositionTable.LOWERBOUND, hashMove)
+                return beta
+    reduce = context.useLateMoveReductions and depth >= LMR_MIN_DEPTH and ply != 0
+    if reduce:
+        if inCheck is None:
+            inCheck = gs.inCheck()
+        reduce = not inCheck
+
+    #move ordering, search the moves most likely to be best first so more of the tree gets pruned
+    pvNode = beta - alpha > 2 * NULL_WINDOW #zero window nodes only ask whether the score is above alpha
     maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMultiplier)
+    bestMove = None
+    batchLeaves = depth == 1 and context.batchEvaluation and not context.useQuiescence and context.evaluation is None
+    if validMoves is None and batchLeaves:
+        validMoves = gs.getValidMoves()
+    if validMoves is None:
+        orderedMoves = moveOrderer.stagedMoves(gs, ply, hashMove)
+    else:
+        moveOrderer.countGenerated(len(validMoves))
+        orderedMoves = moveOrderer.orderMoves(validMoves, ply, hashMove)
+    leafScores = None
+    if batchLeaves:
+        #every child is a leaf, score them all at once (costs the leaves a cutoff would have skipped)
+        leafScores = BatchEval.scoreChildren(gs, orderedMoves, turnMultiplier, CHECKMATE, STALEMATE)
+        context.nodes += len(orderedMoves)
+    movesSearched = 0
+    for index, move in enumerate(orderedMoves):
+        movesSearched += 1
+        if leafScores is not None:
+            score = leafScores[index]
+        else:
+            context.pvLength[ply + 1] = 0 #a quiescence leaf leaves the child's row alone, don't copy an older line from it
+            gs.makeMove(move)
+            score = None
+            if reduce and index >= LMR_MIN_MOVES and move.pieceCaptured == "--" and not move.isPawnPromotion and not gs.inCheck():
+                #a late quiet move is unlikely to be best, check it a ply shallower against alpha first
+                context.reductions += 1
+                score = -searchChild(gs, depth - 2, -alpha - NULL_WINDOW, -alpha, -turnMultiplier, context, ply + 1)
+                if score > alpha and not context.stopped:
+                    context.reSearches += 1
+                    score = None
+            if score is None and context.usePVS and pvNode and index > 0:
+                #the first move is expected to be best, the others only have to be proven no better than alpha
+                score = -searchChild(gs, depth - 1, -alpha - NULL_WINDOW, -alpha, -turnMultiplier, context, ply + 1)
+                if alpha < score < beta and not context.stopped:
+                    context.pvsReSearches += 1
+                    score = None
+            if score is None:
+                score = -searchChild(gs, depth - 1, -beta, -alpha, -turnMultiplier, context, ply + 1)
+            gs.undoMove()
+        if context.stopped: #out of time, the result of this node is meaningless so don't store it
+            return 0
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
-                nextMove = move
-        gs.undoMove()
+            bestMove = move
+            if ply == 0:
+                context.rootBestMove = move
         if maxScore > alpha: #pruning happens
             alpha = maxScore
+            if maxScore < beta: #the best line from here is this move then the best line from the child
+                row = context.pvTable[ply]
+                row[0] = move
+                childLength = context.pvLength[ply + 1]
+                row[1:childLength + 1] = context.pvTable[ply + 1][:childLength]
+                context.pvLength[ply] = childLength + 1
         if alpha >= beta:
+            moveOrderer.recordCutoff(move, ply, depth, index)
             break
+    if movesSearched == 0: #the staged generator had no moves, checkmate or stalemate
+        return -CHECKMATE if gs.inCheck() else STALEMATE
+
+    if maxScore <= alphaOriginal:
+        bound = TranspositionTable.UPPERBOUND
+    elif maxScore >= beta:
+        bound = TranspositionTable.LOWERBOUND
+    else:
+        bound = TranspositionTable.EXACT
+    transpositionTable.store(gs.zobristKey, depth, maxScore, bound, bestMove.moveID if bestMove is not None else None)
+    return maxScore
+
+#searches the position after a move (or a null move) depth plies deep, the score is for the side to move in gs
+#ply is the child's distance from the root, one more than its parent's after a move and the same after a null move
+#at the horizon the quiescence search takes over, without it a leaf still needs all its moves to know about checkmate and stalemate
+def searchChild(gs, depth, alpha, beta, turnMultiplier, context, ply, allowNullMove=True):
+    if depth <= 0:
+        if context.useQuiescence: #the quiescence search generates its own moves, only captures unless in check
+            return quiescenceSearch(gs, alpha, beta, turnMultiplier, context, ply, 0)
+        return findMoveNegaMaxAlphaBeta(gs, gs.getValidMoves(), 0, alpha, beta, turnMultiplier, context, ply)
+    nextMoves = None if context.useStagedMoves else gs.getValidMoves()
+    return findMoveNegaMaxAlphaBeta(gs, nextMoves, depth, alpha, beta, turnMultiplier, context, ply, allowNullMove)
+
+#True if the side to move has a piece other than pawns and the king, without one zugzwang is too likely for a null move
+def hasPieces(gs):
+    color = 'w' if gs.whiteToMove else 'b'
+    for row in gs.board:
+        for square in row:
+            if square[0] == color and square[1] != 'p' and square[1] != 'K':
+                return True
+    return False
+
+#keeps searching captures and promotions past the horizon so the score isn't taken in the middle of an exchange
+#stand pat: the side to move doesn't have to capture, so the static score is a lower bound
+#in check every move is searched (and no moves is checkmate), stalemate isn't detected here
+#ply is where the quiescence search started from the root, qPly how many captures it has made since
+def quiescenceSearch(gs, alpha, beta, turnMultiplier, context, ply, qPly):
+    context.qNodes += 1
+    if (context.nodes + context.qNodes) % CHECK_LIMITS_EVERY == 0:
+        context.checkLimits()
+    if qPly == 0 and context.tablebases is not None:
+        score = tablebaseScore(gs, context)
+        if score is not None:
+            return score
+    inCheck = gs.inCheck()
+    if inCheck:
+        moves = gs.getValidMoves()
+        if len(moves) == 0:
+            return -CHECKMATE
+        standPat = -CHECKMATE
+    else:
+        standPat = turnMultiplier * (staticEvaluation(gs) if context.evaluation is None else context.evaluation(gs))
+        if standPat >= beta or qPly >= QUIESCENCE_MAX_PLY:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        moves = gs.getValidCaptures()
+
+    maxScore = standPat
+    for move in context.moveOrderer.orderMoves(moves, ply + qPly):
+        #delta pruning, even winning the captured piece for free can't raise the score to alpha
+        if not inCheck and not move.isPawnPromotion and \
+                standPat + pieceScores[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+            continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turnMultiplier, context, ply, qPly + 1)
+        gs.undoMove()
+        if context.stopped:
+            return 0
+        if score > maxScore:
+            maxScore = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
     return maxScore
 
 #finding moves using minmax recursively
@@ -126,7 +466,7 @@ def findMoveMinMax(gs, validMoves, depth, whiteToMove):
     
 
 #A positive score for this is good for white, negitive is good for black
-def scoreBoard(gs):
+def scoreBoard(gs, evaluation=None):
     if gs.checkMate:
         if gs.whiteToMove:
             return -CHECKMATE #black wins
@@ -135,15 +475,31 @@ def scoreBoard(gs):
     elif gs.staleMate:
         return STALEMATE
 
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += pieceScores[square[1]]
-            elif square[0] == 'b':
-                score -= pieceScores[square[1]]
+    if evaluation is not None:
+        return evaluation(gs)
+    return staticEvaluation(gs)
+
+#exact score of the position for the side to move from the tablebases, None if it isn't in them
+#quicker mates score higher, but every tablebase win scores below a checkmate found by the search
+def tablebaseScore(gs, context):
+    result = context.tablebases.probe(gs)
+    if result is None:
+        return None
+    context.tbHits += 1
+    outcome, plies = result
+    if outcome == 0:
+        return STALEMATE
+    return outcome * (CHECKMATE - 1 - plies)
+
+#score of the position without looking for checkmate or stalemate, positive is good for white
+def staticEvaluation(gs):
+    if hasattr(gs, 'evaluate'): #material and piece-square totals kept up to date by makeMove/undoMove
+        return gs.evaluate()
+    return scoreMaterial(gs.board)
 
-    return score
+#material only evaluation, for comparing against the piece-square tables
+def materialEvaluation(gs):
+    return scoreMaterial(gs.board)
 
 #score the board based on material
 def scoreMaterial(board):
@@ -0,0 +1,481 @@
+#endgame tablebases: the exact result of every position with a few pieces, so the search can stop as soon as it reaches one
+#tables are made offline by retrograde analysis (working backwards from the checkmates) using ChessEngine's move rules
+#one table per material signature, e.g. "KQK" is white king and queen against the black king, the same table is used
+#with the colours swapped for black king and queen against the white king
+#table file format (little endian):
+#   header: 4 byte magic "CCTB", 4 byte version, 8 byte signature (padded with zero bytes), 4 byte number of entries
+#   entries: one byte per position, 0 = draw, 255 = illegal or unused index, otherwise plies to mate + 1,
+#            so an odd number of plies (even byte) means the side to move wins and an even number means it loses
+#positions are indexed by (white king square, black king square, other pieces' squares..., side to move) after turning the board
+#so the white king is in the a1-d1-d4 triangle (8 symmetries) or on files a-d when there are pawns (left/right mirror only)
+#castling and en passant aren't in the tables, positions with either are never probed
+#generate with: python Tablebase.py generate KQK KRK KPK        (needed smaller tables are made first)
+#probe with:    python Tablebase.py probe --fen "<fen>"
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+import ChessEngine
+
+MAGIC = b"CCTB"
+VERSION = 1
+header = struct.Struct("<4sI8sI")
+DRAW = 0
+ILLEGAL = 255
+MAX_PIECES = 4 #kings included
+pieceOrder = "KQRBNP" #order of the pieces in a signature
+defaultDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+#the 8 symmetries of the board as lists mapping square (r*8 + c) to square, identity first
+allSymmetries = []
+for transpose in (False, True):
+    for flipRows in (False, True):
+        for flipCols in (False, True):
+            mapping = []
+            for sq in range(64):
+                r, c = sq // 8, sq % 8
+                if transpose:
+                    r, c = c, r
+                if flipRows:
+                    r = 7 - r
+                if flipCols:
+                    c = 7 - c
+                mapping.append(r * 8 + c)
+            allSymmetries.append(mapping)
+pawnSymmetries = [allSymmetries[0], allSymmetries[1]] #identity and left/right mirror, pawns can't be turned around
+#white king squares: the a1-d1-d4 triangle without pawns, files a-d with pawns
+kingSlots = [sq for sq in range(64) if sq % 8 <= 3 and 7 - sq // 8 <= sq % 8]
+pawnKingSlots = [sq for sq in range(64) if sq % 8 <= 3]
+
+
+#'P' in signatures is 'p' on the board
+def pieceType(letter):
+    return 'p' if letter == 'P' else letter
+
+def signatureLetter(pieceType):
+    return 'P' if pieceType == 'p' else pieceType
+
+#signature of one side, pieces is a list of piece types ('K', 'Q', 'p'...)
+def sideSignature(pieces):
+    return "".join(sorted((signatureLetter(piece) for piece in pieces), key=pieceOrder.index))
+
+#signature with the side with more material first (tables are only made that way round)
+def normalSignature(whiteSignature, blackSignature):
+    values = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+    whiteKey = (sum(values[letter] for letter in whiteSignature), whiteSignature)
+    blackKey = (sum(values[letter] for letter in blackSignature), blackSignature)
+    return whiteSignature + blackSignature if whiteKey >= blackKey else blackSignature + whiteSignature
+
+#kings only, or a single bishop or knight: nobody can be checkmated
+def insufficientMaterial(signature):
+    others = signature.replace('K', '')
+    return others == "" or others in ("B", "N")
+
+
+#how the positions of one signature are numbered
+class TableLayout():
+    def __init__(self, signature):
+        self.signature = signature
+        split = signature.index('K', 1)
+        self.pieces = ['wK', 'bK'] + ['w' + pieceType(letter) for letter in signature[1:split]] + ['b' + pieceType(letter) for letter in signature[split + 1:]]
+        self.hasPawns = 'P' in signature
+        self.slots = pawnKingSlots if self.hasPawns else kingSlots
+        self.slotIndex = {sq: i for i, sq in enumerate(self.slots)}
+        symmetries = pawnSymmetries if self.hasPawns else allSymmetries
+        #for each white king square, the symmetries that move it onto one of the slots (two when it is on the diagonal)
+        self.kingSymmetries = [[mapping for mapping in symmetries if mapping[sq] in self.slotIndex] for sq in range(64)]
+        self.others = len(self.pieces) - 1 #pieces after the white king
+        self.size = len(self.slots) * 64 ** self.others * 2
+        #runs of identical pieces, their squares are sorted so swapping them gives the same index
+        self.groups = []
+        start = 2
+        while start < len(self.pieces):
+            end = start
+            while end < len(self.pieces) and self.pieces[end] == self.pieces[start]:
+                end += 1
+            if end - start > 1:
+                self.groups.append((start, end))
+            start = end
+
+    #index of squares (in self.pieces order, white king already on a slot)
+    def index(self, squares, whiteToMove):
+        index = self.slotIndex[squares[0]]
+        for i in range(1, len(squares)):
+            index = index * 64 + squares[i]
+        return index * 2 + (0 if whiteToMove else 1)
+
+    #the smallest index of all the symmetric versions of the position, every position has exactly one canonical index
+    def canonicalIndex(self, squares, whiteToMove):
+        best = None
+        for mapping in self.kingSymmetries[squares[0]]:
+            mapped = [mapping[sq] for sq in squares]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            index = self.index(mapped, whiteToMove)
+            if best is None or index < best:
+                best = index
+        return best
+
+    #the opposite of index, returns (squares, whiteToMove)
+    def squaresOf(self, index):
+        whiteToMove = index % 2 == 0
+        index //= 2
+        squares = []
+        for i in range(self.others):
+            squares.append(index % 64)
+            index //= 64
+        squares.append(self.slots[index])
+        squares.reverse()
+        return squares, whiteToMove
+
+    #squares in self.pieces order from (piece, square) pairs, colours swapped and the board turned over when flip is True
+    def orderSquares(self, position, flip):
+        squaresByPiece = {}
+        for piece, sq in position:
+            if flip:
+                piece = ('b' if piece[0] == 'w' else 'w') + piece[1]
+                sq ^= 56 #row r becomes row 7 - r
+            squaresByPiece.setdefault(piece, []).append(sq)
+        return [squaresByPiece[piece].pop() for piece in self.pieces]
+
+
+class Table():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, signature, count = header.unpack_from(self.data, 0)
+        self.layout = TableLayout(signature.rstrip(b"\0").decode())
+        if magic != MAGIC or version != VERSION or count != self.layout.size or len(self.data) != header.size + count:
+            self.close()
+            raise ValueError("tablebase " + path + " is not a version %d table file" % VERSION)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def value(self, index):
+        return self.data[header.size + index]
+
+
+#every table in a directory, probe() is what the search uses
+class Tablebases():
+    def __init__(self, directory=defaultDirectory):
+        self.directory = directory
+        self.tables = {}
+        self.maxPieces = 0
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".tb"):
+                    self.addTable(Table(os.path.join(directory, name)))
+        self.resetStats()
+
+    def addTable(self, table):
+        self.tables[table.layout.signature] = table
+        self.maxPieces = max(len(table.layout.pieces) for table in self.tables.values())
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+    #raw table value for position, a list of (piece, square) pairs, None if there is no table for it
+    def lookup(self, position, whiteToMove):
+        whiteSignature = sideSignature([piece[1] for piece, sq in position if piece[0] == 'w'])
+        blackSignature = sideSignature([piece[1] for piece, sq in position if piece[0] == 'b'])
+        table = self.tables.get(whiteSignature + blackSignature)
+        if table is not None:
+            return table.value(table.layout.canonicalIndex(table.layout.orderSquares(position, False), whiteToMove))
+        table = self.tables.get(blackSignature + whiteSignature)
+        if table is not None: #same table with the colours swapped
+            return table.value(table.layout.canonicalIndex(table.layout.orderSquares(position, True), not whiteToMove))
+        if insufficientMaterial(whiteSignature + blackSignature):
+            return DRAW
+        return None
+
+    #(pieces, castling rights or capturable en passant) means the tables can't say anything about the position
+    def canProbe(self, gs):
+        rights = gs.currentCastlingRight
+        if rights.wks or rights.wqs or rights.bks or rights.bqs:
+            return False
+        if gs.isEnpassantMove != (): #only matters if a pawn can actually take en passant
+            epRow, epCol = gs.isEnpassantMove
+            pawn = 'wp' if gs.whiteToMove else 'bp'
+            pawnRow = epRow + 1 if gs.whiteToMove else epRow - 1
+            for c in (epCol - 1, epCol + 1):
+                if 0 <= c < 8 and gs.board[pawnRow][c] == pawn:
+                    return False
+        return True
+
+    #returns (result, plies to mate) for the side to move, result is 1 win, 0 draw, -1 loss, or None if the position isn't in a table
+    def probe(self, gs):
+        position = []
+        for r in range(8):
+            for c in range(8):
+                if gs.board[r][c] != "--":
+                    position.append((gs.board[r][c], r * 8 + c))
+                    if len(position) > self.maxPieces:
+                        return None
+        if not self.canProbe(gs):
+            return None
+        self.probes += 1
+        value = self.lookup(position, gs.whiteToMove)
+        if value is None or value == ILLEGAL:
+            return None
+        self.hits += 1
+        if value == DRAW:
+            return 0, 0
+        plies = value - 1
+        return (1 if plies % 2 == 1 else -1), plies
+
+
+#tables that captures and promotions from signature lead to (without the ones that are always drawn)
+def requiredSignatures(signature):
+    split = signature.index('K', 1)
+    sides = [signature[:split], signature[split:]]
+    required = set()
+    for side in range(2):
+        for i in range(1, len(sides[side])):
+            changed = list(sides)
+            changed[side] = sides[side][:i] + sides[side][i + 1:] #captured
+            required.add(tuple(changed))
+            if sides[side][i] == 'P':
+                for promotion in "QRBN":
+                    changed = list(sides)
+                    changed[side] = sideSignature(list(sides[side][:i] + promotion + sides[side][i + 1:]))
+                    required.add(tuple(changed))
+    return sorted(set(normalSignature(white, black) for white, black in required if not insufficientMaterial(white + black)))
+
+#sets gs up with the pieces on squares, no castling and no en passant
+#quicker than loadFen, the zobrist key and evaluation totals aren't updated
+def setPosition(gs, pieces, squares, whiteToMove):
+    board = [["--"] * 8 for r in range(8)]
+    for piece, sq in zip(pieces, squares):
+        board[sq // 8][sq % 8] = piece
+    gs.board = board
+    gs.whiteKingLocation = (squares[0] // 8, squares[0] % 8)
+    gs.blackKingLocation = (squares[1] // 8, squares[1] % 8)
+    gs.whiteToMove = whiteToMove
+    gs.isEnpassantMove = ()
+    gs.currentCastlingRight = ChessEngine.castleRightsByMask[0]
+    gs.moveLog = []
+
+#True if the squares are a position that can be in the table (no two pieces on a square, no pawns on the first or last rank,
+#kings not touching)
+def validSquares(layout, squares):
+    if len(set(squares)) != len(squares):
+        return False
+    for piece, sq in zip(layout.pieces, squares):
+        if piece[1] == 'p' and (sq < 8 or sq >= 56):
+            return False
+    wk, bk = squares[0], squares[1]
+    return abs(wk // 8 - bk // 8) > 1 or abs(wk % 8 - bk % 8) > 1
+
+#positions the side that just moved could have come from with a move that isn't a capture or promotion,
+#as canonical indexes (the same index can come out more than once)
+def predecessors(layout, squares, whiteToMove):
+    moverColor = 'b' if whiteToMove else 'w'
+    occupied = set(squares)
+    for i, piece in enumerate(layout.pieces):
+        if piece[0] != moverColor:
+            continue
+        r, c = squares[i] // 8, squares[i] % 8
+        origins = []
+        if piece[1] == 'p':
+            back = 1 if moverColor == 'w' else -1
+            startRow = 6 if moverColor == 'w' else 1
+            if 1 <= r + back <= 6 and (r + back) * 8 + c not in occupied:
+                origins.append((r + back) * 8 + c)
+                if r + 2 * back == startRow and (r + 2 * back) * 8 + c not in occupied:
+                    origins.append((r + 2 * back) * 8 + c)
+        elif piece[1] == 'N' or piece[1] == 'K':
+            for m in (ChessEngine.knightMoves if piece[1] == 'N' else ChessEngine.kingMoves):
+                startRow, startCol = r + m[0], c + m[1]
+                if 0 <= startRow < 8 and 0 <= startCol < 8 and startRow * 8 + startCol not in occupied:
+                    origins.append(startRow * 8 + startCol)
+        else:
+            for d in ChessEngine.slidingDirections[piece[1]]:
+                startRow, startCol = r + d[0], c + d[1]
+                while 0 <= startRow < 8 and 0 <= startCol < 8 and startRow * 8 + startCol not in occupied:
+                    origins.append(startRow * 8 + startCol)
+                    startRow += d[0]
+                    startCol += d[1]
+        for origin in origins:
+            before = list(squares)
+            before[i] = origin
+            if piece[1] == 'K' and not validSquares(layout, before):
+                continue
+            yield layout.canonicalIndex(before, not whiteToMove)
+
+#builds the table for signature by retrograde analysis, tablebases has to have the tables its captures and promotions lead to
+#returns the table as a bytearray
+def generateTable(signature, tablebases, log=None):
+    layout = TableLayout(signature)
+    size = layout.size
+    values = bytearray(size) #0 until resolved (still 0 at the end is a draw)
+    counters = bytearray(size) #different positions a move that stays in this table leads to that aren't known wins for the opponent yet
+    blocked = bytearray(size) #1 if a capture or promotion draws or wins, so the position can never be lost
+    exitLoss = bytearray(size) #longest loss through a capture or promotion (in plies), a loss can't be any quicker
+    processed = bytearray(size) #1 once a resolved position has passed its result back to its predecessors
+    buckets = {} #plies -> positions resolved at that many plies to mate
+    gs = ChessEngine.GameState()
+    gs.underpromotions = True
+    startTime = time.perf_counter()
+
+    for index in range(size):
+        squares, whiteToMove = layout.squaresOf(index)
+        if not validSquares(layout, squares) or layout.canonicalIndex(squares, whiteToMove) != index:
+            values[index] = ILLEGAL
+            continue
+        setPosition(gs, layout.pieces, squares, whiteToMove)
+        opponentKing = squares[1] if whiteToMove else squares[0]
+        if gs.isSquareAttacked(opponentKing // 8, opponentKing % 8, 'w' if whiteToMove else 'b'): #side that just moved left its king in check
+            values[index] = ILLEGAL
+            continue
+        moves = gs.getValidMoves()
+        if len(moves) == 0:
+            if gs.checkMate:
+                values[index] = 1
+                buckets.setdefault(0, []).append(index)
+            else:
+                blocked[index] = 1 #stalemate
+            continue
+        pieceAt = {sq: i for i, sq in enumerate(squares)}
+        successors = set()
+        exitWin = None
+        for move in moves:
+            startSq = move.startRow * 8 + move.startCol
+            endSq = move.endRow * 8 + move.endCol
+            if move.pieceCaptured == "--" and not move.isPawnPromotion:
+                after = list(squares)
+                after[pieceAt[startSq]] = endSq
+                successors.add(layout.canonicalIndex(after, not whiteToMove))
+                continue
+            position = []
+            for piece, sq in zip(layout.pieces, squares):
+                if sq == startSq:
+                    position.append((piece[0] + move.promotionPiece if move.isPawnPromotion else piece, endSq))
+                elif sq != endSq:
+                    position.append((piece, sq))
+            value = tablebases.lookup(position, not whiteToMove)
+            if value is None:
+                raise RuntimeError("tablebase for " + signature + " needs the tables " + ", ".join(requiredSignatures(signature)))
+            if value == DRAW:
+                blocked[index] = 1
+            elif (value - 1) % 2 == 0: #opponent loses
+                blocked[index] = 1
+                if exitWin is None or value < exitWin:
+                    exitWin = value
+            else:
+                exitLoss[index] = max(exitLoss[index], value)
+        counters[index] = len(successors)
+        if exitWin is not None: #resolved when its bucket comes up, unless a quicker win is found first
+            buckets.setdefault(exitWin, []).append(index)
+        elif len(successors) == 0 and not blocked[index]: #every move is a capture or promotion that loses
+            values[index] = exitLoss[index] + 1
+            buckets.setdefault(exitLoss[index], []).append(index)
+    if log:
+        log("%s: %d positions set up in %.1fs" % (signature, size, time.perf_counter() - startTime))
+
+    #work backwards from the mates one ply at a time
+    while buckets:
+        plies = min(buckets)
+        resolved = 0
+        for index in buckets.pop(plies):
+            if values[index] == 0:
+                values[index] = plies + 1
+            elif values[index] != plies + 1 or processed[index]: #already resolved with a quicker mate, or in the bucket twice
+                continue
+            processed[index] = 1
+            resolved += 1
+            squares, whiteToMove = layout.squaresOf(index)
+            if plies % 2 == 0: #side to move loses here, so every position that can move here wins
+                for previous in predecessors(layout, squares, whiteToMove):
+                    if values[previous] == 0:
+                        values[previous] = plies + 2
+                        buckets.setdefault(plies + 1, []).append(previous)
+            else: #side to move wins here, a position whose moves all lead to wins like this loses
+                for previous in set(predecessors(layout, squares, whiteToMove)):
+                    if values[previous] == 0 and not blocked[previous]:
+                        counters[previous] -= 1
+                        if counters[previous] == 0:
+                            loss = max(plies + 1, exitLoss[previous])
+                            values[previous] = loss + 1
+                            buckets.setdefault(loss, []).append(previous)
+        if log and resolved:
+            log("%s: %d positions with mate in %d plies" % (signature, resolved, plies))
+    if log:
+        log("%s: done in %.1fs" % (signature, time.perf_counter() - startTime))
+    return values
+
+def writeTable(signature, values, path):
+    with open(path, "wb") as f:
+        f.write(header.pack(MAGIC, VERSION, signature.encode(), len(values)))
+        f.write(values)
+
+#generates signature and anything it needs into directory, skipping tables that are already there
+def generate(signature, tablebases, directory=defaultDirectory, log=print):
+    if signature in tablebases.tables or insufficientMaterial(signature):
+        return
+    split = signature.index('K', 1)
+    if signature[split:] + signature[:split] in tablebases.tables: #colour swapped version already exists
+        return
+    if len(signature) > MAX_PIECES:
+        raise ValueError("tablebases only go up to %d pieces: %s" % (MAX_PIECES, signature))
+    for required in requiredSignatures(signature):
+        generate(required, tablebases, directory, log)
+    values = generateTable(signature, tablebases, log)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, signature + ".tb")
+    writeTable(signature, values, path)
+    tablebases.addTable(Table(path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate or probe endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generateCommand = commands.add_parser("generate", help="generate tables by retrograde analysis")
+    generateCommand.add_argument("signatures", nargs="+", help="material like KQK or KRKN, the stronger side first")
+    generateCommand.add_argument("--directory", default=defaultDirectory)
+    probeCommand = commands.add_parser("probe", help="look up a position")
+    probeCommand.add_argument("--fen", required=True)
+    probeCommand.add_argument("--directory", default=defaultDirectory)
+    args = parser.parse_args(argv)
+
+    tablebases = Tablebases(args.directory)
+    if args.command == "generate":
+        for signature in args.signatures:
+            generate(signature.upper(), tablebases, args.directory)
+        return 0
+
+    gs = ChessEngine.GameState()
+    gs.loadFen(args.fen)
+    gs.underpromotions = True
+    result = tablebases.probe(gs)
+    if result is None:
+        print("not in the tablebases")
+        return 1
+    print(describe(result))
+    for move in gs.getValidMoves(): #the result after each move, from the side to move's point of view
+        gs.makeMove(move)
+        after = tablebases.probe(gs)
+        gs.undoMove()
+        if after is not None:
+            print(move.getChessNotation(), describe((-after[0], after[1] + 1 if after[0] else 0)))
+    return 0
+
+def describe(result):
+    if result[0] == 0:
+        return "draw"
+    return "%s for the side to move, mate in %d plies" % ("win" if result[0] == 1 else "loss", result[1])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+#headless self-play matches between engine configurations, games are played in parallel in a process pool
+#every pair of engines plays the same openings twice, once with each colour, and the results are reported as
+#an Elo difference with a 95% error bar along with each engine's nodes per second and time per move
+#an engine is written as comma separated key=value settings, for example:
+#   python Tournament.py --engine name=full,depth=3 --engine name=material,depth=3,eval=material --games 20
+#keys: name, depth, time (seconds per move), nodes (per move), hash (MB), eval (full or material),
+#quiescence, tablebases, bitboards, batch, staged, nullmove, lmr, pvs, aspiration (on or off, batch is the NumPy leaf
+#evaluation and needs quiescence=off, staged is the staged move generation, nullmove and lmr are null move pruning and late
+#move reductions, pvs is the principal variation search and aspiration the aspiration windows)
+#compare a pruning switch with for example: python Tournament.py --engine name=lmr,depth=4 --engine name=nolmr,depth=4,lmr=off
+#a game ends in checkmate, stalemate, threefold repetition, the fifty move rule, insufficient material or the move limit
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+import OpeningBook
+import Tablebase
+
+MAX_MOVES = 150 #moves each before a game is called a draw
+OPENING_PLIES = 8
+evaluations = {"full": None, "material": SmartMoveFinder.materialEvaluation}
+
+#tablebases opened by each worker process, shared by all of its games
+workerTablebases = None
+
+
+def parseSwitch(text):
+    if text.lower() in ("on", "true", "yes", "1"):
+        return True
+    if text.lower() in ("off", "false", "no", "0"):
+        return False
+    raise ValueError("'" + text + "' is not on or off")
+
+def parseEvaluation(text):
+    if text not in evaluations:
+        raise ValueError("unknown evaluation '" + text + "', use " + " or ".join(evaluations))
+    return text
+
+#engine setting key -> (EngineConfig attribute, conversion)
+engineOptions = {"name": ("name", str), "depth": ("maxDepth", int), "time": ("timeLimit", float), "nodes": ("nodeLimit", int),
+                 "hash": ("ttSizeMB", int), "eval": ("evaluation", parseEvaluation), "quiescence": ("useQuiescence", parseSwitch),
+                 "tablebases": ("useTablebases", parseSwitch), "bitboards": ("useBitboards", parseSwitch),
+                 "batch": ("useBatchEvaluation", parseSwitch), "staged": ("useStagedMoves", parseSwitch),
+                 "nullmove": ("useNullMove", parseSwitch), "lmr": ("useLateMoveReductions", parseSwitch),
+                 "pvs": ("usePVS", parseSwitch), "aspiration": ("useAspirationWindows", parseSwitch)}
+
+
+#one engine taking part in the tournament, plain values only so it can be sent to the worker processes
+class EngineConfig():
+    def __init__(self, spec=""):
+        self.name = spec or "default"
+        self.maxDepth = SmartMoveFinder.DEPTH
+        self.timeLimit = None
+        self.nodeLimit = None
+        self.ttSizeMB = 8
+        self.evaluation = "full"
+        self.useQuiescence = True
+        self.useTablebases = False
+        self.useBitboards = False
+        self.useBatchEvaluation = False
+        self.useStagedMoves = True
+        self.useNullMove = True
+        self.useLateMoveReductions = True
+        self.usePVS = True
+        self.useAspirationWindows = True
+        for setting in spec.split(","):
+            if not setting.strip():
+                continue
+            key, equals, value = setting.partition("=")
+            key = key.strip()
+            if key not in engineOptions or not equals:
+                raise ValueError("bad engine setting '" + setting + "', use key=value with a key out of " + ", ".join(engineOptions))
+            attribute, convert = engineOptions[key]
+            setattr(self, attribute, convert(value.strip()))
+
+    def makeContext(self):
+        global workerTablebases
+        tablebases = None
+        if self.useTablebases:
+            if workerTablebases is None:
+                workerTablebases = Tablebase.Tablebases(Tablebase.defaultDirectory)
+            tablebases = workerTablebases
+        return SmartMoveFinder.SearchContext(maxDepth=self.maxDepth, timeLimit=self.timeLimit, nodeLimit=self.nodeLimit, ttSizeMB=self.ttSizeMB,
+                                             useQuiescence=self.useQuiescence, tablebases=tablebases, evaluation=evaluations[self.evaluation],
+                                             batchEvaluation=self.useBatchEvaluation, useStagedMoves=self.useStagedMoves,
+                                             useNullMove=self.useNullMove, useLateMoveReductions=self.useLateMoveReductions,
+                                             usePVS=self.usePVS, useAspirationWindows=self.useAspirationWindows)
+
+    def makeGameState(self, fen):
+        gs = BitboardEngine.BitboardGameState() if self.useBitboards else ChessEngine.GameState()
+        gs.loadFen(fen)
+        gs.underpromotions = True
+        return gs
+
+
+#FENs of count opening positions, made by playing OPENING_PLIES moves out of the opening book
+#(random legal moves once the book runs out), the same seed always gives the same openings
+def makeOpenings(count, plies=OPENING_PLIES, seed=0):
+    rng = random.Random(seed)
+    book = OpeningBook.openDefaultBook()
+    openings = []
+    while len(openings) < count:
+        gs = ChessEngine.GameState()
+        for ply in range(plies):
+            validMoves = gs.getValidMoves()
+            if len(validMoves) == 0:
+                break
+            move = book.pickMove(gs, validMoves, rng) if book is not None else None
+            if move is None:
+                move = rng.choice(validMoves)
+            gs.makeMove(move)
+        if len(gs.getValidMoves()) > 0: #don't start a game that is already over
+            openings.append(gs.getFen())
+    if book is not None:
+        book.close()
+    return openings
+
+#kings only, or kings and a single bishop or knight
+def isInsufficientMaterial(board):
+    signature = "".join('P' if square[1] == 'p' else square[1] for row in board for square in row if square != "--")
+    return Tablebase.insufficientMaterial(signature)
+
+#runs in a worker process, plays one game from fen and returns a dictionary with the result, moves and search statistics
+#the result is "1-0", "0-1" or "1/2-1/2" and stats has the totals for white and black
+def playGame(white, black, fen, maxMoves=MAX_MOVES):
+    contexts = {True: white.makeContext(), False: black.makeContext()}
+    states = {True: white.makeGameState(fen), False: black.makeGameState(fen)} #each engine plays on its own move generator
+    stats = {True: {"moves": 0, "seconds": 0.0, "nodes": 0, "depth": 0}, False: {"moves": 0, "seconds": 0.0, "nodes": 0, "depth": 0}}
+    repetitions = {}
+    moves = []
+    result, reason = None, None
+    while result is None:
+        whiteToMove = states[True].whiteToMove
+        gs = states[whiteToMove]
+        repetitions[gs.zobristKey] = repetitions.get(gs.zobristKey, 0) + 1
+        validMoves = gs.getValidMoves()
+        if gs.checkMate:
+            result, reason = ("0-1" if whiteToMove else "1-0"), "checkmate"
+        elif gs.staleMate:
+            result, reason = "1/2-1/2", "stalemate"
+        elif repetitions[gs.zobristKey] >= 3:
+            result, reason = "1/2-1/2", "repetition"
+        elif gs.halfmoveClock >= 100:
+            result, reason = "1/2-1/2", "fifty moves"
+        elif isInsufficientMaterial(gs.board):
+            result, reason = "1/2-1/2", "insufficient material"
+        elif len(moves) >= maxMoves * 2:
+            result, reason = "1/2-1/2", "move limit"
+        if result is not None:
+            break
+
+        context = contexts[whiteToMove]
+        startTime = time.perf_counter()
+        move = SmartMoveFinder.findBestMove(gs, validMoves, context)
+        seconds = time.perf_counter() - startTime
+        if move is None: #the search was stopped before finishing an iteration
+            move = validMoves[0]
+        engineStats = stats[whiteToMove]
+        engineStats["moves"] += 1
+        engineStats["seconds"] += seconds
+        engineStats["nodes"] += context.nodes + context.qNodes
+        engineStats["depth"] += context.completedDepth
+        moves.append(move.getChessNotation())
+        gs.makeMove(move)
+        other = states[not whiteToMove]
+        for otherMove in other.getValidMoves():
+            if otherMove.moveID == move.moveID:
+                other.makeMove(otherMove)
+                break
+    return {"white": white.name, "black": black.name, "fen": fen, "result": result, "reason": reason, "moves": moves,
+            "stats": {"white": stats[True], "black": stats[False]}}
+
+
+#Elo difference for a score fraction (0 to 1)
+def eloDifference(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+#(Elo difference, 95% error margin) from wins, draws and losses
+def eloFromResults(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    upper = eloDifference(min(score + margin, 1))
+    lower = eloDifference(max(score - margin, 0))
+    if math.isinf(upper) or math.isinf(lower): #a clean sweep (or close to one) doesn't bound the difference
+        return eloDifference(score), math.inf
+    return eloDifference(score), (upper - lower) / 2
+
+#plays every pair of engines against each other over the openings (each one twice, with the colours swapped)
+#calls report(game, finished, total) as each game finishes, returns (list of games, summary dictionary)
+def runTournament(engines, openings, maxMoves=MAX_MOVES, workers=None, report=None):
+    tasks = []
+    for first, second in itertools.combinations(engines, 2):
+        for fen in openings:
+            tasks.append((first, second, fen))
+            tasks.append((second, first, fen))
+    games = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(playGame, white, black, fen, maxMoves) for white, black, fen in tasks]
+        for future in as_completed(futures):
+            games.append(future.result())
+            if report is not None:
+                report(games[-1], len(games), len(tasks))
+    return games, summarise(engines, games)
+
+#pairings (wins, draws, losses and Elo of the first engine against the second) and per engine speed totals
+def summarise(engines, games):
+    pairings = []
+    for first, second in itertools.combinations(engines, 2):
+        wins = draws = losses = 0
+        for game in games:
+            if {game["white"], game["black"]} != {first.name, second.name}:
+                continue
+            if game["result"] == "1/2-1/2":
+                draws += 1
+            elif (game["result"] == "1-0") == (game["white"] == first.name):
+                wins += 1
+            else:
+                losses += 1
+        elo, margin = eloFromResults(wins, draws, losses)
+        pairings.append({"engine": first.name, "opponent": second.name, "wins": wins, "draws": draws, "losses": losses,
+                         "elo": round(elo, 1), "margin": round(margin, 1)})
+    speeds = []
+    for engine in engines:
+        totals = {"moves": 0, "seconds": 0.0, "nodes": 0, "depth": 0}
+        for game in games:
+            for colour in ("white", "black"):
+                if game[colour] == engine.name:
+                    for key in totals:
+                        totals[key] += game["stats"][colour][key]
+        moves = totals["moves"]
+        speeds.append({"engine": engine.name, "moves": moves, "nps": int(totals["nodes"] / totals["seconds"]) if totals["seconds"] > 0 else 0,
+                       "secondsPerMove": round(totals["seconds"] / moves, 4) if moves else 0.0,
+                       "averageDepth": round(totals["depth"] / moves, 2) if moves else 0.0})
+    return {"pairings": pairings, "engines": speeds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other")
+    parser.add_argument("--engine", action="append", default=[], help="engine settings, key=value separated by commas (give at least two)")
+    parser.add_argument("--games", type=int, default=10, help="games per pair of engines (rounded up to an even number)")
+    parser.add_argument("--max-moves", type=int, default=MAX_MOVES, help="moves each before the game is a draw")
+    parser.add_argument("--opening-plies", type=int, default=OPENING_PLIES, help="book or random moves played before the engines take over")
+    parser.add_argument("--openings", help="file of opening FENs to use instead of book openings")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the book openings")
+    parser.add_argument("--workers", type=int, help="games played at once (default one per cpu)")
+    parser.add_argument("--json", help="write the games and results to this file as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        engines = [EngineConfig(spec) for spec in args.engine]
+    except ValueError as e:
+        parser.error(str(e))
+    if len(engines) < 2:
+        parser.error("give at least two --engine settings")
+    if len(set(engine.name for engine in engines)) != len(engines):
+        for number, engine in enumerate(engines, 1): #name them so the results can be told apart
+            engine.name = "%d:%s" % (number, engine.name)
+    count = (args.games + 1) // 2
+    if args.openings:
+        with open(args.openings) as f:
+            fens = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        openings = [fens[i % len(fens)] for i in range(count)]
+    else:
+        openings = makeOpenings(count, args.opening_plies, args.seed)
+
+    def report(game, finished, total):
+        print("game %d/%d: %s - %s %s (%s, %d moves)" % (finished, total, game["white"], game["black"], game["result"], game["reason"], (len(game["moves"]) + 1) // 2))
+    startTime = time.perf_counter()
+    games, summary = runTournament(engines, openings, args.max_moves, args.workers, report)
+    print("%d games in %.1fs" % (len(games), time.perf_counter() - startTime))
+    print()
+    for pairing in summary["pairings"]:
+        print("%s vs %s: +%d =%d -%d  Elo %+.1f +/- %.1f" % (pairing["engine"], pairing["opponent"], pairing["wins"], pairing["draws"], pairing["losses"], pairing["elo"], pairing["margin"]))
+    print()
+    for speed in summary["engines"]:
+        print("%-20s %6d moves  %8d nodes/s  %7.3fs/move  depth %.2f" % (speed["engine"], speed["moves"], speed["nps"], speed["secondsPerMove"], speed["averageDepth"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"engines": [vars(engine) for engine in engines], "games": games, "summary": summary}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
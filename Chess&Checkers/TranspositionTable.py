@@ -0,0 +1,87 @@
+#fixed size transposition table for the alpha beta search
+#positions are found by GameState.zobristKey, each entry remembers how deep the position was searched,
+#the score, whether the score is exact or only a bound, and the moveID of the best move found
+#the table is split into buckets of two slots:
+#   the depth slot keeps the deepest search of the bucket (unless it is from an old search)
+#   the always slot takes everything the depth slot turns down
+#so deep results survive while recent shallow results still get stored
+
+#bound types
+EXACT = 0 #score is the true score of the position
+LOWERBOUND = 1 #search failed high (beta cutoff), true score is at least this
+UPPERBOUND = 2 #search failed low, true score is at most this
+
+#rough memory used by one slot: the entry tuple plus the ints in it
+ENTRY_BYTES = 120
+SLOTS_PER_BUCKET = 2
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB=16):
+        self.sizeMB = sizeMB
+        self.numBuckets = max(1, int(sizeMB * 1024 * 1024) // (ENTRY_BYTES * SLOTS_PER_BUCKET))
+        self.clear()
+
+    #empties the table and resets the counters
+    def clear(self):
+        #entries are tuples of (key, depth, score, bound, best moveID, age)
+        self.depthSlots = [None] * self.numBuckets
+        self.alwaysSlots = [None] * self.numBuckets
+        self.age = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0 #hits whose score was good enough to skip searching the position (counted by the search)
+        self.stores = 0
+        self.collisions = 0 #stores that threw away a different position
+
+    #call at the start of every search so entries from earlier moves can be replaced first
+    def newSearch(self):
+        self.age = (self.age + 1) & 0xFF
+
+    #returns the entry for key or None
+    def probe(self, key):
+        self.probes += 1
+        bucket = key % self.numBuckets
+        entry = self.depthSlots[bucket]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.alwaysSlots[bucket]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, bestMoveID):
+        self.stores += 1
+        bucket = key % self.numBuckets
+        entry = (key, depth, score, bound, bestMoveID, self.age)
+        old = self.depthSlots[bucket]
+        if old is None or old[0] == key or old[5] != self.age or depth >= old[1]:
+            if old is not None and old[0] != key:
+                self.collisions += 1
+            self.depthSlots[bucket] = entry
+        else:
+            old = self.alwaysSlots[bucket]
+            if old is not None and old[0] != key:
+                self.collisions += 1
+            self.alwaysSlots[bucket] = entry
+
+    #how full the table is, in parts per thousand (sampled from the first 1000 buckets)
+    def hashfull(self):
+        sample = min(1000, self.numBuckets)
+        used = 0
+        for i in range(sample):
+            if self.depthSlots[i] is not None and self.depthSlots[i][5] == self.age:
+                used += 1
+            if self.alwaysSlots[i] is not None and self.alwaysSlots[i][5] == self.age:
+                used += 1
+        return used * 1000 // (sample * SLOTS_PER_BUCKET)
+
+    def getStats(self):
+        return {'sizeMB': self.sizeMB, 'slots': self.numBuckets * SLOTS_PER_BUCKET, 'probes': self.probes, 'hits': self.hits,
+                'cutoffs': self.cutoffs, 'stores': self.stores, 'collisions': self.collisions,
+                'hitRate': self.hits / self.probes if self.probes else 0.0, 'hashfull': self.hashfull()}